@@ -1,44 +1,193 @@
-from collections.abc import Generator
-from typing import Annotated
+import hashlib
+import time
+import uuid
+from collections.abc import AsyncGenerator, Generator
+from typing import Annotated, TypeVar
 
-import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core import security
+from app.core.cache import (
+    auth_user_cache,
+    cache_auth_user,
+    recent_writer_cache,
+    token_cache,
+)
 from app.core.config import settings
-from app.core.db import engine
-from app.models import TokenPayload, User
+from app.core.db import (
+    async_engine,
+    engine,
+    get_async_engine,
+    get_engine,
+    replica_engines,
+)
+from app.core.jwt_keys import token_keys
+from app.core.revocation import revoked_sessions, user_auth_states
+from app.models import AuthUser, TokenPayload, User
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
 
-def get_db() -> Generator[Session, None, None]:
+# Requests with these methods don't write and can be served by a replica
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Set after a write so the client's next reads see it on the primary
+PRIMARY_STICKY_COOKIE = "db_primary_sticky"
+# The same as a response header with the time (epoch seconds) reads stay on
+# the primary until, for clients that don't send cookies to echo back
+PRIMARY_UNTIL_HEADER = "X-DB-Primary-Until"
+
+
+def _token_subject(request: Request) -> str | None:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_token(token).sub
+    except HTTPException:
+        return None
+
+
+def _primary_until(request: Request) -> float:
+    try:
+        return float(request.headers.get(PRIMARY_UNTIL_HEADER, 0))
+    except ValueError:
+        return 0
+
+
+def use_replica(request: Request, response: Response) -> bool:
+    """
+    Whether the request can read from a replica: it's a read, and neither
+    the client nor, on this worker, its user wrote within the stickiness.
+    """
+    if not replica_engines:
+        return False
+    subject = _token_subject(request)
+    if request.method not in SAFE_METHODS:
+        stickiness = settings.POSTGRES_REPLICA_STICKINESS_SECONDS
+        response.set_cookie(
+            PRIMARY_STICKY_COOKIE,
+            "1",
+            max_age=stickiness,
+            httponly=True,
+            samesite="lax",
+        )
+        response.headers[PRIMARY_UNTIL_HEADER] = f"{time.time() + stickiness:.3f}"
+        if subject:
+            recent_writer_cache.set(subject, True)
+        return False
+    if PRIMARY_STICKY_COOKIE in request.cookies:
+        return False
+    if subject and recent_writer_cache.get(subject):
+        return False
+    return _primary_until(request) <= time.time()
+
+
+ReplicaDep = Annotated[bool, Depends(use_replica)]
+
+
+def get_db(read_only: ReplicaDep) -> Generator[Session, None, None]:
+    with Session(get_engine(read_only=read_only)) as session:
+        yield session
+
+
+def get_read_only_db() -> Generator[Session, None, None]:
+    with Session(get_engine(read_only=True)) as session:
+        yield session
+
+
+def get_read_write_db() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
 
 
+# expire_on_commit=False: attributes can't be lazily reloaded outside of an
+# awaited call, so keep them populated after commit for serialization.
+async def get_async_db(read_only: ReplicaDep) -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(
+        get_async_engine(read_only=read_only), expire_on_commit=False
+    ) as session:
+        yield session
+
+
+async def get_async_read_only_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(
+        get_async_engine(read_only=True), expire_on_commit=False
+    ) as session:
+        yield session
+
+
+async def get_async_read_write_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def get_request_async_engine(read_only: ReplicaDep) -> AsyncEngine:
+    """
+    Engine the request's session would use, for work that has to manage its
+    own session, like responses streamed after the route returned.
+    """
+    return get_async_engine(read_only=read_only)
+
+
+# SessionDep picks the primary or a replica from the request method,
+# the explicit variants pin a route to one side.
 SessionDep = Annotated[Session, Depends(get_db)]
+ReadOnlySessionDep = Annotated[Session, Depends(get_read_only_db)]
+ReadWriteSessionDep = Annotated[Session, Depends(get_read_write_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
+AsyncReadOnlySessionDep = Annotated[AsyncSession, Depends(get_async_read_only_db)]
+AsyncReadWriteSessionDep = Annotated[AsyncSession, Depends(get_async_read_write_db)]
+AsyncEngineDep = Annotated[AsyncEngine, Depends(get_request_async_engine)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def decode_token(token: str) -> TokenPayload:
+    # Keyed by digest so the cache doesn't hold usable tokens
+    key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
+        payload = token_keys.decode(token)
         token_data = TokenPayload(**payload)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        token_cache.set(key, token_data, ttl=expires_in)
+    return token_data
+
+
+def get_token_payload(token: TokenDep) -> TokenPayload:
+    token_data = decode_token(token)
+    # Tokens bound to a signed-out device; checked in memory, see
+    # app.core.revocation. Runs for cached tokens too, so a revocation
+    # applies to them without touching the token cache.
+    if token_data.sid and revoked_sessions.is_revoked(token_data.sid):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Session has been revoked",
+        )
+    return token_data
+
+
+TokenPayloadDep = Annotated[TokenPayload, Depends(get_token_payload)]
+
+
+UserT = TypeVar("UserT", User, AuthUser)
+
+
+def _check_active_user(user: UserT | None) -> UserT:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -46,7 +195,109 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
+def _check_token_version(token_data: TokenPayload, user: UserT | None) -> None:
+    # Tokens from before versioning count as version 0, so they are revoked
+    # by the first password change like any other
+    if user and (token_data.ver or 0) != user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+
+
+def _verified_user(token_data: TokenPayload, user: User | None) -> User:
+    if user:
+        cache_auth_user(user)
+    _check_token_version(token_data, user)
+    return _check_active_user(user)
+
+
+def get_current_user(session: SessionDep, token_data: TokenPayloadDep) -> User:
+    return _verified_user(token_data, session.get(User, token_data.sub))
+
+
+async def get_current_user_async(
+    session: AsyncSessionDep, token_data: TokenPayloadDep
+) -> User:
+    return _verified_user(token_data, await session.get(User, token_data.sub))
+
+
+async def _load_identity(engine: AsyncEngine, token_data: TokenPayload) -> AuthUser:
+    identity = auth_user_cache.get(str(token_data.sub))
+    if identity is None:
+        async with AsyncSession(engine) as session:
+            user = await session.get(User, token_data.sub)
+        if user:
+            cache_auth_user(user)
+            identity = AuthUser.model_validate(user)
+    _check_token_version(token_data, identity)
+    return _check_active_user(identity)
+
+
+async def get_current_identity(
+    engine: AsyncEngineDep, token_data: TokenPayloadDep
+) -> AuthUser:
+    """
+    Like get_current_user, but only the auth fields, served from the
+    per-worker cache when possible so the request never touches the database.
+    """
+    return await _load_identity(engine, token_data)
+
+
+async def get_current_claims(
+    engine: AsyncEngineDep, token_data: TokenPayloadDep
+) -> AuthUser:
+    """
+    Authorize from the token's claims, without a lookup.
+
+    The claims are only trusted once the token version matches this
+    worker's copy of the user's auth state, see app.core.revocation, which
+    follows version bumps within seconds. The flags that revoke tokens are
+    taken from that copy too. Users not in it yet, and tokens issued
+    without claims, go through get_current_identity.
+    """
+    if token_data.ver is None or token_data.sub is None:
+        return await _load_identity(engine, token_data)
+    cached = auth_user_cache.get(token_data.sub)
+    if cached:
+        _check_token_version(token_data, cached)
+        return _check_active_user(cached)
+    try:
+        state = user_auth_states.get(uuid.UUID(token_data.sub))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    if state is None:
+        return await _load_identity(engine, token_data)
+    if state.token_version != token_data.ver:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    try:
+        claims = AuthUser(
+            id=token_data.sub,
+            email=token_data.email,
+            is_active=state.is_active,
+            is_verified=token_data.is_verified,
+            is_admin=state.is_admin,
+            token_version=state.token_version,
+        )
+    except ValidationError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    return _check_active_user(claims)
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
+# For routes that only need the user's id and flags, not the row itself
+CurrentIdentity = Annotated[AuthUser, Depends(get_current_identity)]
+CurrentClaims = Annotated[AuthUser, Depends(get_current_claims)]
 
 
 def get_current_active_superuser(current_user: CurrentUser) -> User:
@@ -55,3 +306,13 @@ def get_current_active_superuser(current_user: CurrentUser) -> User:
             status_code=403, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+async def get_current_active_superuser_async(
+    current_user: CurrentIdentity,
+) -> AuthUser:
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403, detail="The user doesn't have enough privileges"
+        )
+    return current_user
@@ -0,0 +1,51 @@
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+from typing import Literal
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, text
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# How list endpoints fill in `count`: exact count(*), a planner estimate
+# from pg_class statistics, or not at all.
+CountMode = Literal["exact", "estimated", "none"]
+
+
+def encode_cursor(sort: str, value: datetime, id: uuid.UUID) -> str:
+    """
+    Opaque keyset cursor pointing just after the row (value, id) in `sort` order.
+    """
+    raw = json.dumps({"s": sort, "v": value.isoformat(), "id": str(id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        if data["s"] != sort:
+            raise ValueError("cursor was issued for another sort order")
+        return datetime.fromisoformat(data["v"]), uuid.UUID(data["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def estimated_row_count(session: AsyncSession, model: type[SQLModel]) -> int:
+    """
+    Row count of a whole table from planner statistics, without a scan.
+
+    Falls back to an exact count when the table has never been analyzed.
+    """
+    statement = text(
+        "SELECT reltuples::bigint FROM pg_class"
+        " WHERE oid = to_regclass(quote_ident(:table))"
+    ).bindparams(table=model.__table__.name)  # type: ignore[attr-defined]
+    estimate = (await session.execute(statement)).scalar()
+    if estimate is None or estimate < 0:
+        exact = select(func.count()).select_from(model)
+        return int((await session.execute(exact)).scalar_one())
+    return int(estimate)
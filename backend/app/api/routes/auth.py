@@ -1,21 +1,43 @@
+import re
 from datetime import timedelta
 from typing import Annotated, Any
 
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app import crud
-from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
+from app.api.deps import (
+    AsyncReadWriteSessionDep,
+    AsyncSessionDep,
+    CurrentUser,
+    SessionDep,
+    get_current_active_superuser,
+)
 from app.core import security
+from app.core.cache import invalidate_auth_user
 from app.core.config import settings
-from app.core.google_auth import create_google_oauth_flow, verify_google_token
-from app.core.security import get_password_hash
-from app.models import Message, NewPassword, Token, UserPublic, UserRegister, UserCreate
+from app.core.google_auth import (
+    create_google_oauth_flow,
+    exchange_google_code,
+    verify_google_token,
+)
+from app.core.login_throttle import client_ip, login_throttle
+from app.core.outbox import enqueue_email
+from app.models import (
+    Message,
+    NewPassword,
+    Token,
+    User,
+    UserCreate,
+    UserPublic,
+    UserRegister,
+    UserSession,
+)
 from app.utils import (
     generate_password_reset_token,
     generate_reset_password_email,
-    send_email,
     verify_password_reset_token,
     generate_new_account_email,
     generate_confirmation_token,
@@ -24,28 +46,55 @@ from app.utils import (
 
 router = APIRouter(tags=["login"])
 
+_MOBILE_USER_AGENT = re.compile(r"Mobile|Android|iPhone", re.IGNORECASE)
+
+
+def _login_session(request: Request, user: User) -> UserSession:
+    """The device a login comes from; the token is bound to it."""
+    user_agent = request.headers.get("user-agent", "")
+    return UserSession(
+        user_id=user.id,
+        device_name=user_agent[:255] or "Unknown Device",
+        device_type="Mobile" if _MOBILE_USER_AGENT.search(user_agent) else "Desktop",
+        device_ip=client_ip(request),
+    )
+
+
+def _session_access_token(user: User, user_session: UserSession) -> str:
+    return security.create_access_token(
+        user.id,
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+        claims={**security.user_claims(user), "sid": str(user_session.id)},
+    )
+
 
 @router.post("/access-token")
-def login_access_token(
-    session: SessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+async def login_access_token(
+    request: Request,
+    session: AsyncSessionDep,
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Token:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud.authenticate(
+    ip = client_ip(request)
+    await login_throttle.check(form_data.username, ip)
+    user = await crud.authenticate_async(
         session=session, email=form_data.username, password=form_data.password
     )
     if not user:
+        await login_throttle.record_failure(form_data.username, ip)
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    elif not user.is_active:
+    await login_throttle.record_success(form_data.username, ip)
+    if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     elif not user.is_verified:
         raise HTTPException(status_code=400, detail=[{"message": "Email not verified", "email": user.email}])
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    user_session = _login_session(request, user)
+    session.add(user_session)
+    await session.commit()
     return Token(
-        access_token=security.create_access_token(
-            user.id, expires_delta=access_token_expires
-        ),
+        access_token=_session_access_token(user, user_session),
         token_type="bearer",
         expiry=settings.ACCESS_TOKEN_EXPIRE_MINUTES
     )
@@ -65,11 +114,13 @@ def resend_confirmation(session: SessionDep, email: str) -> Message:
         username=user.email, 
         token=confirmation_token
     )
-    send_email(
+    enqueue_email(
+        session,
         email_to=user.email,
         subject=email_data.subject,
         html_content=email_data.html_content,
     )
+    session.commit()
     return Message(message="Confirmation email sent")
 
 
@@ -87,6 +138,7 @@ def confirm_email(token: str, session: SessionDep) -> Message:
     user.is_verified = True
     session.add(user)
     session.commit()
+    invalidate_auth_user(user.id)
     
     # Return a message indicating whether the user needs to change their password
     if user.requires_password_change:
@@ -95,14 +147,14 @@ def confirm_email(token: str, session: SessionDep) -> Message:
 
 
 @router.post("/setup-password/")
-def setup_password(session: SessionDep, body: NewPassword) -> Message:
+async def setup_password(session: AsyncSessionDep, body: NewPassword) -> Message:
     """
     Set up password after email confirmation
     """
     email = verify_password_reset_token(token=body.token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await crud.get_user_by_email_async(session=session, email=email)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -113,10 +165,9 @@ def setup_password(session: SessionDep, body: NewPassword) -> Message:
     elif not user.is_verified:
         raise HTTPException(status_code=400, detail="Email not verified")
     
-    hashed_password = get_password_hash(password=body.new_password)
-    user.password_hash = hashed_password
-    session.add(user)
-    session.commit()
+    await crud.update_password_async(
+        session=session, db_user=user, password=body.new_password
+    )
     return Message(message="Password set up successfully")
 
 
@@ -144,23 +195,25 @@ def recover_password(email: str, session: SessionDep) -> Message:
     email_data = generate_reset_password_email(
         email_to=user.email, email=email, token=password_reset_token
     )
-    send_email(
+    enqueue_email(
+        session,
         email_to=user.email,
         subject=email_data.subject,
         html_content=email_data.html_content,
     )
+    session.commit()
     return Message(message="Password recovery email sent")
 
 
 @router.post("/reset-password/")
-def reset_password(session: SessionDep, body: NewPassword) -> Message:
+async def reset_password(session: AsyncSessionDep, body: NewPassword) -> Message:
     """
     Reset password
     """
     email = verify_password_reset_token(token=body.token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await crud.get_user_by_email_async(session=session, email=email)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -168,10 +221,9 @@ def reset_password(session: SessionDep, body: NewPassword) -> Message:
         )
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    hashed_password = get_password_hash(password=body.new_password)
-    user.password_hash = hashed_password
-    session.add(user)
-    session.commit()
+    await crud.update_password_async(
+        session=session, db_user=user, password=body.new_password
+    )
     return Message(message="Password updated successfully")
 
 
@@ -216,45 +268,31 @@ async def google_login() -> RedirectResponse:
 
 
 @router.get("/google/callback")
-async def google_callback(request: Request, session: SessionDep) -> RedirectResponse:
+async def google_callback(
+    request: Request, session: AsyncReadWriteSessionDep
+) -> RedirectResponse:
     """
     Handle Google OAuth callback
     """
-    flow = create_google_oauth_flow()
-    
-    # Get the full URL including query parameters
-    full_url = str(request.url)
-    
-    # For local development, ensure we're using http
-    if "localhost" in request.url.netloc:
-        full_url = full_url.replace("https://", "http://")
-    
-    try:
-        # Set the environment variable for this request
-        import os
-        os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
-        
-        # Ignore scope mismatch errors
-        os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] = "1"
-        
-        flow.fetch_token(authorization_response=full_url)
-    except Exception as e:
+    code = request.query_params.get("code")
+    if not code:
+        error = request.query_params.get("error", "missing authorization code")
         raise HTTPException(
             status_code=400,
-            detail=f"Failed to fetch token: {str(e)}"
+            detail=f"Failed to fetch token: {error}"
         )
-    
-    credentials = flow.credentials
-    id_info = verify_google_token(credentials.id_token)
+    tokens = await exchange_google_code(code)
+    # Usually served from the cached certificates, but a refresh is blocking
+    id_info = await run_in_threadpool(verify_google_token, tokens["id_token"])
     
     email = id_info["email"]
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await crud.get_user_by_email_async(session=session, email=email)
     
     if not user:
         # Create new user
         user_data = UserCreate(
             email=email,
-            password=credentials.id_token,  # Use token as password
+            password=tokens["id_token"],  # Use token as password
             first_name=id_info.get("given_name"),
             last_name=id_info.get("family_name"),
             avatar_url=id_info.get("picture"),
@@ -263,7 +301,7 @@ async def google_callback(request: Request, session: SessionDep) -> RedirectResp
             social_login_id=id_info["sub"],
             is_verified=True,  # Google accounts are pre-verified
         )
-        user = crud.create_user(session=session, user_create=user_data)
+        user = await crud.create_user_async(session=session, user_create=user_data)
     elif not user.social_login:
         # Link existing account with Google
         user.social_login = True
@@ -271,12 +309,13 @@ async def google_callback(request: Request, session: SessionDep) -> RedirectResp
         user.social_login_id = id_info["sub"]
         user.is_verified = True
         session.add(user)
-        session.commit()
+        await session.commit()
+        invalidate_auth_user(user.id)
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = security.create_access_token(
-        user.id, expires_delta=access_token_expires
-    )
+    user_session = _login_session(request, user)
+    session.add(user_session)
+    await session.commit()
+    access_token = _session_access_token(user, user_session)
     
     # Redirect to the frontend with the access token
     frontend_url = settings.FRONTEND_HOST
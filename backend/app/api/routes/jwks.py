@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Response
+
+from app.core.jwt_keys import token_keys
+
+# Served at the root, where JWT libraries look for it, not under /api/v1
+router = APIRouter(tags=["jwks"])
+
+
+@router.get("/.well-known/jwks.json")
+def read_jwks() -> Response:
+    """
+    Public keys access tokens are signed with, for other services to verify
+    them locally. Empty while tokens are signed with the shared secret.
+    """
+    return Response(
+        content=token_keys.jwks_json,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=300"},
+    )
@@ -1,109 +1,517 @@
+import codecs
+import csv
+import io
+import json
 import uuid
-from typing import Any
+from collections.abc import AsyncIterator, Iterable, Iterator
+from datetime import datetime
+from typing import Any, Literal
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import Uuid, any_, bindparam, delete, tuple_, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session, col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models import Subscription, SubscriptionCreate, SubscriptionPublic, SubscriptionsPublic, SubscriptionUpdate, Message
+from app import crud
+from app.api.deps import (
+    AsyncCurrentUser,
+    AsyncEngineDep,
+    AsyncSessionDep,
+    CurrentClaims,
+    SessionDep,
+)
+from app.api.pagination import (
+    CountMode,
+    decode_cursor,
+    encode_cursor,
+    estimated_row_count,
+)
+from app.core.config import settings
+from app.models import (
+    Message,
+    Subscription,
+    SubscriptionBulkDelete,
+    SubscriptionBulkUpdate,
+    SubscriptionCreate,
+    SubscriptionImportError,
+    SubscriptionImportResult,
+    SubscriptionPublic,
+    SubscriptionsDeleted,
+    SubscriptionsPublic,
+    SubscriptionUpdate,
+)
 
 router = APIRouter(prefix="/subscriptions", tags=["subscriptions"])
 
 
 @router.get("/", response_model=SubscriptionsPublic)
-def read_subscriptions(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_subscriptions(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    sort: Literal["created_at", "next_billing_date"] = "created_at",
+    count_mode: CountMode = "exact",
 ) -> Any:
     """
     Retrieve subscriptions.
+
+    Pages are ordered by `sort`, then id. Pass the returned `next_cursor`
+    as `cursor` to fetch the next page without an OFFSET scan; `skip` is
+    ignored when a cursor is given.
+
+    `count_mode` picks how `count` is computed: `exact`, `estimated` from
+    table statistics (superusers only, others always get the exact
+    maintained counter) or `none` to skip it.
     """
+    sort_column = col(getattr(Subscription, sort))
+    statement = select(Subscription).order_by(sort_column, col(Subscription.id))
+    if not current_user.is_admin:
+        statement = statement.where(Subscription.user_id == current_user.id)
+    if cursor:
+        after_value, after_id = decode_cursor(cursor, sort)
+        statement = statement.where(
+            tuple_(sort_column, col(Subscription.id)) > tuple_(after_value, after_id)
+        )
+    else:
+        statement = statement.offset(skip)
 
-    if current_user.is_superuser:
+    count: int | None = None
+    if count_mode != "none" and not current_user.is_admin:
+        # Kept up to date by triggers on subscription, so no scan is needed
+        count = current_user.subscription_count
+    elif count_mode == "estimated":
+        count = await estimated_row_count(session, Subscription)
+    elif count_mode == "exact":
         count_statement = select(func.count()).select_from(Subscription)
-        count = session.exec(count_statement).one()
-        statement = select(Subscription).offset(skip).limit(limit)
-        subscriptions = session.exec(statement).all()
-    else:
-        count_statement = (
-            select(func.count())
-            .select_from(Subscription)
-            .where(Subscription.user_id == current_user.id)
-        )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Subscription)
-            .where(Subscription.user_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
+        count = (await session.exec(count_statement)).one()
+
+    subscriptions = (await session.exec(statement.limit(limit))).all()
+
+    next_cursor = None
+    if subscriptions and len(subscriptions) == limit:
+        last = subscriptions[-1]
+        next_cursor = encode_cursor(sort, getattr(last, sort), last.id)
+    return SubscriptionsPublic(data=subscriptions, count=count, next_cursor=next_cursor)
+
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = list(SubscriptionPublic.model_fields)
+
+
+async def _export_subscriptions(
+    engine: AsyncEngine, statement: SelectOfScalar[Subscription], format: str
+) -> AsyncIterator[str]:
+    # The session lives as long as the response body, not the route call
+    async with AsyncSession(engine) as session:
+        result = await session.stream_scalars(
+            statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
         )
-        subscriptions = session.exec(statement).all()
+        if format == "csv":
+            yield ",".join(EXPORT_FIELDS) + "\r\n"
+        async for batch in result.partitions():
+            rows = [SubscriptionPublic.model_validate(s) for s in batch]
+            if format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in rows:
+                    values = row.model_dump(mode="json")
+                    writer.writerow([values[field] for field in EXPORT_FIELDS])
+                yield buffer.getvalue()
+            else:
+                yield "".join(row.model_dump_json() + "\n" for row in rows)
+            # Keep memory flat however many rows are exported
+            session.expunge_all()
+
 
-    return SubscriptionsPublic(data=subscriptions, count=count)
+@router.get("/export")
+async def export_subscriptions(
+    engine: AsyncEngineDep,
+    current_user: CurrentClaims,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    active: bool | None = None,
+    category: str | None = None,
+    billing_from: datetime | None = None,
+    billing_to: datetime | None = None,
+) -> StreamingResponse:
+    """
+    Stream all matching subscriptions as NDJSON or CSV, ordered by next
+    billing date. Rows are read through a server-side cursor in batches.
+    """
+    statement = select(Subscription).order_by(
+        col(Subscription.next_billing_date), col(Subscription.id)
+    )
+    if not current_user.is_admin:
+        statement = statement.where(Subscription.user_id == current_user.id)
+    if active is not None:
+        statement = statement.where(Subscription.active == active)
+    if category is not None:
+        statement = statement.where(Subscription.category == category)
+    if billing_from is not None:
+        statement = statement.where(col(Subscription.next_billing_date) >= billing_from)
+    if billing_to is not None:
+        statement = statement.where(col(Subscription.next_billing_date) < billing_to)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_subscriptions(engine, statement, format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="subscriptions.{format}"'
+        },
+    )
 
 
 @router.get("/{id}", response_model=SubscriptionPublic)
-def read_subscription(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+async def read_subscription(session: AsyncSessionDep, current_user: CurrentClaims, id: uuid.UUID) -> Any:
     """
     Get subscription by ID.
     """
-    subscription = session.get(Subscription, id)
+    subscription = await session.get(Subscription, id)
     if not subscription:
         raise HTTPException(status_code=404, detail="Subscription not found")
-    if not current_user.is_superuser and (subscription.user_id != current_user.id):
+    if not current_user.is_admin and (subscription.user_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     return subscription
 
 
 @router.post("/", response_model=SubscriptionPublic)
-def create_subscription(
-    *, session: SessionDep, current_user: CurrentUser, subscription_in: SubscriptionCreate
+async def create_subscription(
+    *, session: AsyncSessionDep, current_user: CurrentClaims, subscription_in: SubscriptionCreate
 ) -> Any:
     """
     Create new subscription.
     """
     subscription = Subscription.model_validate(subscription_in, update={"user_id": current_user.id})
     session.add(subscription)
-    session.commit()
-    session.refresh(subscription)
+    await session.commit()
+    await session.refresh(subscription)
     return subscription
 
 
+def _validated_subscriptions(
+    rows: Iterable[Any],
+    user_id: uuid.UUID,
+    errors: list[SubscriptionImportError],
+    start: int = 1,
+) -> Iterator[Subscription]:
+    """
+    Validate import rows one at a time, yielding the valid ones and
+    collecting per-row errors. `start` is the position of the first row.
+    """
+    for index, row in enumerate(rows, start=start):
+        if index > settings.SUBSCRIPTION_IMPORT_MAX_ROWS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Imports are limited to {settings.SUBSCRIPTION_IMPORT_MAX_ROWS} rows",
+            )
+        if not isinstance(row, dict):
+            errors.append(
+                SubscriptionImportError(row=index, errors=["Expected an object"])
+            )
+            continue
+        try:
+            subscription_in = SubscriptionCreate.model_validate(
+                {**row, "user_id": user_id}
+            )
+        except ValidationError as e:
+            messages = [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in e.errors()
+            ]
+            errors.append(SubscriptionImportError(row=index, errors=messages))
+            continue
+        yield Subscription.model_validate(subscription_in, update={"user_id": user_id})
+
+
+def _import_subscriptions(
+    session: Session, user_id: uuid.UUID, rows: Iterable[Any]
+) -> SubscriptionImportResult:
+    errors: list[SubscriptionImportError] = []
+    imported = crud.bulk_create_subscriptions(
+        session=session,
+        subscriptions=_validated_subscriptions(rows, user_id, errors),
+    )
+    session.commit()
+    return SubscriptionImportResult(imported=imported, errors=errors)
+
+
+IMPORT_BATCH_SIZE = 1000
+
+_json_decoder = json.JSONDecoder()
+
+
+def _invalid_json(detail: str) -> HTTPException:
+    return HTTPException(status_code=422, detail=f"Invalid JSON array: {detail}")
+
+
+async def _json_array_items(
+    chunks: AsyncIterator[bytes], max_bytes: int
+) -> AsyncIterator[Any]:
+    """
+    Parse a JSON array from a byte stream, yielding each element as soon as
+    it is complete. Only the element being read is buffered.
+    """
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    position = 0
+    received = 0
+    # "open" before the "[", then "item", "next" after each element, "end"
+    state = "open"
+    first = True
+    finished = False
+    while True:
+        chunk = b""
+        if not finished:
+            try:
+                chunk = await anext(chunks)
+            except StopAsyncIteration:
+                finished = True
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(
+                status_code=413, detail=f"Imports are limited to {max_bytes} bytes"
+            )
+        try:
+            buffer = buffer[position:] + text.decode(chunk, final=finished)
+        except UnicodeDecodeError:
+            raise _invalid_json("body is not UTF-8")
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            if state == "open":
+                if char != "[":
+                    raise _invalid_json("expected '['")
+                position += 1
+                state = "item"
+            elif state == "item":
+                if char == "]" and first:
+                    position += 1
+                    state = "end"
+                    continue
+                try:
+                    item, end = _json_decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError as e:
+                    if finished:
+                        raise _invalid_json(e.msg)
+                    break
+                if end == len(buffer) and not finished:
+                    # A number may continue in the next chunk
+                    break
+                position = end
+                first = False
+                state = "next"
+                yield item
+            elif state == "next":
+                if char not in ",]":
+                    raise _invalid_json("expected ',' or ']'")
+                position += 1
+                state = "item" if char == "," else "end"
+            else:
+                raise _invalid_json("unexpected data after the array")
+        if finished:
+            if state != "end":
+                raise _invalid_json("unexpected end of body")
+            return
+
+
+@router.post(
+    "/import",
+    response_model=SubscriptionImportResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/SubscriptionCreate"},
+                    }
+                }
+            },
+        }
+    },
+)
+async def import_subscriptions(
+    request: Request, session: SessionDep, current_user: CurrentClaims
+) -> Any:
+    """
+    Bulk create subscriptions from a JSON array of SubscriptionCreate objects.
+
+    The body is parsed as it arrives and written in batches of COPY, so
+    neither the raw body nor the whole array is held in memory. Valid rows
+    are inserted in one transaction; invalid ones are skipped and reported
+    with their position. `user_id` is always the current user.
+    """
+    max_bytes = settings.SUBSCRIPTION_IMPORT_MAX_BYTES
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(
+            status_code=413, detail=f"Imports are limited to {max_bytes} bytes"
+        )
+
+    errors: list[SubscriptionImportError] = []
+    imported = 0
+    batch: list[Any] = []
+    start = 1
+
+    def write_batch(rows: list[Any], first: int) -> int:
+        return crud.bulk_create_subscriptions(
+            session=session,
+            subscriptions=_validated_subscriptions(
+                rows, current_user.id, errors, first
+            ),
+        )
+
+    async for row in _json_array_items(request.stream(), max_bytes):
+        batch.append(row)
+        if len(batch) == IMPORT_BATCH_SIZE:
+            imported += await run_in_threadpool(write_batch, batch, start)
+            start += len(batch)
+            batch = []
+    if batch:
+        imported += await run_in_threadpool(write_batch, batch, start)
+    await run_in_threadpool(session.commit)
+    return SubscriptionImportResult(imported=imported, errors=errors)
+
+
+@router.post("/import/csv", response_model=SubscriptionImportResult)
+def import_subscriptions_csv(
+    session: SessionDep, current_user: CurrentClaims, file: UploadFile
+) -> Any:
+    """
+    Bulk create subscriptions from a CSV file with a header row naming
+    SubscriptionCreate fields. Empty cells take the field's default.
+    """
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    rows = (
+        {key: value for key, value in row.items() if key and value != ""}
+        for row in csv.DictReader(text)
+    )
+    return _import_subscriptions(session, current_user.id, rows)
+
+
+def _ids_param(ids: list[uuid.UUID]) -> Any:
+    # One array parameter instead of IN (...): the SQL text stays the same
+    # whatever the number of ids, so it caches and prepares as one statement.
+    return any_(bindparam("ids", ids, type_=postgresql.ARRAY(Uuid())))
+
+
+# The only patchable columns that may be cleared; the others are NOT NULL
+NULLABLE_PATCH_FIELDS = {"description"}
+
+
+@router.patch("/bulk", response_model=SubscriptionsPublic)
+async def bulk_update_subscriptions(
+    *, session: AsyncSessionDep, current_user: CurrentClaims, body: SubscriptionBulkUpdate
+) -> Any:
+    """
+    Apply the same patch to many subscriptions with a single UPDATE.
+
+    Ids that don't exist or belong to another user are skipped; the updated
+    subscriptions are returned.
+    """
+    values = body.patch.model_dump(exclude_unset=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    nulls = sorted(
+        key
+        for key, value in values.items()
+        if value is None and key not in NULLABLE_PATCH_FIELDS
+    )
+    if nulls:
+        raise HTTPException(
+            status_code=422, detail=f"Cannot be null: {', '.join(nulls)}"
+        )
+    values["updated_at"] = datetime.utcnow()
+    statement = (
+        update(Subscription)
+        .where(col(Subscription.id) == _ids_param(body.ids))
+        .values(**values)
+        .returning(Subscription)
+    )
+    if not current_user.is_admin:
+        statement = statement.where(col(Subscription.user_id) == current_user.id)
+    result = await session.execute(
+        statement, execution_options={"synchronize_session": False}
+    )
+    subscriptions = result.scalars().all()
+    await session.commit()
+    return SubscriptionsPublic(data=subscriptions, count=len(subscriptions))
+
+
+@router.post("/bulk-delete", response_model=SubscriptionsDeleted)
+async def bulk_delete_subscriptions(
+    *, session: AsyncSessionDep, current_user: CurrentClaims, body: SubscriptionBulkDelete
+) -> Any:
+    """
+    Delete many subscriptions with a single DELETE.
+
+    Ids that don't exist or belong to another user are skipped; the ids
+    actually deleted are returned.
+    """
+    statement = (
+        delete(Subscription)
+        .where(col(Subscription.id) == _ids_param(body.ids))
+        .returning(col(Subscription.id))
+    )
+    if not current_user.is_admin:
+        statement = statement.where(col(Subscription.user_id) == current_user.id)
+    result = await session.execute(
+        statement, execution_options={"synchronize_session": False}
+    )
+    ids = list(result.scalars().all())
+    await session.commit()
+    return SubscriptionsDeleted(ids=ids, count=len(ids))
+
+
 @router.put("/{id}", response_model=SubscriptionPublic)
-def update_subscription(
+async def update_subscription(
     *,
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
+    current_user: CurrentClaims,
     id: uuid.UUID,
     subscription_in: SubscriptionUpdate,
 ) -> Any:
     """
     Update an subscription.
     """
-    subscription = session.get(Subscription, id)
+    subscription = await session.get(Subscription, id)
     if not subscription:
         raise HTTPException(status_code=404, detail="Subscription not found")
-    if not current_user.is_superuser and (subscription.user_id != current_user.id):
+    if not current_user.is_admin and (subscription.user_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     update_dict = subscription_in.model_dump(exclude_unset=True)
     subscription.sqlmodel_update(update_dict)
     session.add(subscription)
-    session.commit()
-    session.refresh(subscription)
+    await session.commit()
+    await session.refresh(subscription)
     return subscription
 
 
 @router.delete("/{id}")
-def delete_subscription(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def delete_subscription(
+    session: AsyncSessionDep, current_user: CurrentClaims, id: uuid.UUID
 ) -> Message:
     """
     Delete an subscription.
     """
-    subscription = session.get(Subscription, id)
+    subscription = await session.get(Subscription, id)
     if not subscription:
         raise HTTPException(status_code=404, detail="Subscription not found")
-    if not current_user.is_superuser and (subscription.user_id != current_user.id):
+    if not current_user.is_admin and (subscription.user_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(subscription)
-    session.commit()
+    await session.delete(subscription)
+    await session.commit()
     return Message(message="Subscription deleted successfully")
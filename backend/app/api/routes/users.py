@@ -4,18 +4,37 @@ from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, col, delete, func, select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import tuple_, update
+from sqlalchemy.orm import joinedload, selectinload
 
 from app import crud
 from app.api.deps import (
+    AsyncCurrentUser,
+    AsyncSessionDep,
+    CurrentClaims,
     CurrentUser,
     SessionDep,
+    TokenPayloadDep,
     get_current_user,
     get_db,
     get_current_active_superuser,
+    get_current_active_superuser_async,
 )
+from app.api.pagination import (
+    CountMode,
+    decode_cursor,
+    encode_cursor,
+    estimated_row_count,
+)
+from app.core.cache import invalidate_auth_user
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.outbox import enqueue_email
+from app.core.revocation import (
+    record_user_deletion,
+    revoked_sessions,
+    user_auth_states,
+)
+from app.core.security import verify_password_async
 from app.models import (
     Subscription,
     Message,
@@ -37,7 +56,7 @@ from app.models import (
     UserSessionsCreateData,
     UserSessionsCreateResponse,
 )
-from app.utils import generate_new_account_email, send_email, generate_confirmation_token
+from app.utils import generate_new_account_email, generate_confirmation_token
 
 import logging
 logging.basicConfig(level=logging.DEBUG)
@@ -47,49 +66,87 @@ user_sessions_router = APIRouter(prefix="/users/user-sessions", tags=["user-sess
 
 
 @router.post("/signup", response_model=UserPublic)
-def register_user(session: SessionDep, user_in: UserRegister) -> Any:
+async def register_user(session: AsyncSessionDep, user_in: UserRegister) -> Any:
     """
     Create new user without the need to be logged in.
     """
-    user = crud.get_user_by_email(session=session, email=user_in.email)
+    user = await crud.get_user_by_email_async(session=session, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
     user_create = UserCreate.model_validate(user_in)
-    user = crud.create_user(session=session, user_create=user_create)
+    # Committed together with the confirmation email below
+    user = await crud.create_user_async(
+        session=session, user_create=user_create, commit=False
+    )
+    await session.refresh(user, ["preferences"])
     confirmation_token = generate_confirmation_token(email=user_in.email)
     email_data = generate_new_account_email(
         email_to=user.email, 
         username=user.email, 
         token=confirmation_token
     )
-    send_email(
+    enqueue_email(
+        session,
         email_to=user.email,
         subject=email_data.subject,
         html_content=email_data.html_content,
     )
+    await session.commit()
     return user
 
 
 @router.get(
     "/",
-    dependencies=[Depends(get_current_active_superuser)],
+    dependencies=[Depends(get_current_active_superuser_async)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+async def read_users(
+    session: AsyncSessionDep,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count_mode: CountMode = "exact",
+) -> Any:
     """
     Retrieve users.
-    """
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    Pages are ordered by creation time. Pass the returned `next_cursor` as
+    `cursor` to fetch the next page; `skip` is ignored when a cursor is given.
+    `count_mode` is one of `exact`, `estimated` (table statistics) or `none`.
+    """
 
-    statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+    count: int | None = None
+    if count_mode == "estimated":
+        count = await estimated_row_count(session, User)
+    elif count_mode == "exact":
+        count_statement = select(func.count()).select_from(User)
+        count = (await session.exec(count_statement)).one()
+
+    # Preferences are part of UserPublic; load them up front since the async
+    # session can't lazy-load them during serialization.
+    statement = (
+        select(User)
+        .options(selectinload(User.preferences))
+        .order_by(col(User.created_at), col(User.id))
+        .limit(limit)
+    )
+    if cursor:
+        after_created_at, after_id = decode_cursor(cursor, "created_at")
+        statement = statement.where(
+            tuple_(col(User.created_at), col(User.id))
+            > tuple_(after_created_at, after_id)
+        )
+    else:
+        statement = statement.offset(skip)
+    users = (await session.exec(statement)).all()
 
-    return UsersPublic(data=users, count=count)
+    next_cursor = None
+    if users and len(users) == limit:
+        next_cursor = encode_cursor("created_at", users[-1].created_at, users[-1].id)
+    return UsersPublic(data=users, count=count, next_cursor=next_cursor)
 
 
 @router.post(
@@ -114,7 +171,7 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
     # Set requires_password_change to true for users created by an admin
     user_in.requires_password_change = True
     
-    user = crud.create_user(session=session, user_create=user_in)
+    user = crud.create_user(session=session, user_create=user_in, commit=False)
     
     if settings.emails_enabled and user_in.email:
         confirmation_token = generate_confirmation_token(email=user_in.email)
@@ -123,24 +180,29 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
             username=user.email, 
             token=confirmation_token
         )
-        send_email(
+        enqueue_email(
+            session,
             email_to=user.email,
             subject=email_data.subject,
             html_content=email_data.html_content,
         )
+    session.commit()
+    session.refresh(user)
     return user
 
 
 @router.patch("/me", response_model=UserPublic)
-def update_user_me(
-    *, session: SessionDep, user_in: UserUpdateMe, current_user: CurrentUser
+async def update_user_me(
+    *, session: AsyncSessionDep, user_in: UserUpdateMe, current_user: AsyncCurrentUser
 ) -> Any:
     """
     Update own user.
     """
 
     if user_in.email:
-        existing_user = crud.get_user_by_email(session=session, email=user_in.email)
+        existing_user = await crud.get_user_by_email_async(
+            session=session, email=user_in.email
+        )
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(
                 status_code=409, detail="User with this email already exists"
@@ -148,44 +210,41 @@ def update_user_me(
     user_data = user_in.model_dump(exclude_unset=True)
     current_user.sqlmodel_update(user_data)
     session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
+    await session.commit()
+    invalidate_auth_user(current_user.id)
+    await session.refresh(current_user, ["preferences"])
     return current_user
 
 
 @router.patch("/me/password", response_model=Message)
-def update_password_me(
-    *, session: SessionDep, body: UpdatePassword, current_user: CurrentUser
+async def update_password_me(
+    *, session: AsyncSessionDep, body: UpdatePassword, current_user: AsyncCurrentUser
 ) -> Any:
     """
     Update own password.
     """
-    if not verify_password(body.current_password, current_user.password_hash):
+    if not await verify_password_async(
+        body.current_password, current_user.password_hash
+    ):
         raise HTTPException(status_code=400, detail="Incorrect password")
     if body.current_password == body.new_password:
         raise HTTPException(
             status_code=400, detail="New password cannot be the same as the current one"
         )
-    password_hash = get_password_hash(body.new_password)
-    current_user.password_hash = password_hash
-    session.add(current_user)
-    session.commit()
+    await crud.update_password_async(
+        session=session, db_user=current_user, password=body.new_password
+    )
     return Message(message="Password updated successfully")
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+async def read_user_me(session: AsyncSessionDep, current_user: AsyncCurrentUser) -> Any:
     """
     Get current user.
     """
-    # Get user with preferences
-    user_with_preferences = session.get(User, current_user.id)
-    
-    # Ensure we have the latest data with preferences included
-    if user_with_preferences:
-        session.refresh(user_with_preferences)
-        return user_with_preferences
-    
+    # current_user was just loaded by this session; only the preferences
+    # relationship still needs fetching.
+    await session.refresh(current_user, ["preferences"])
     return current_user
 
 
@@ -201,7 +260,10 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
     statement = delete(Subscription).where(col(Subscription.owner_id) == current_user.id)
     session.exec(statement)  # type: ignore
     session.delete(current_user)
+    record_user_deletion(session, current_user.id)
     session.commit()
+    invalidate_auth_user(current_user.id)
+    user_auth_states.discard(current_user.id)
     return Message(message="User deleted successfully")
 
 
@@ -252,7 +314,11 @@ def read_user_sessions(
     """
     Get all sessions for the current user.
     """
-    statement = select(UserSession).where(UserSession.user_id == current_user.id)
+    statement = (
+        select(UserSession)
+        .where(UserSession.user_id == current_user.id)
+        .where(col(UserSession.revoked_at).is_(None))
+    )
     sessions = session.exec(statement).all()
     return UserSessionsReadResponse(sessions=sessions)
 
@@ -318,6 +384,52 @@ def update_current_session(
     return target_session
 
 
+@router.delete("/user-sessions/{session_id}", response_model=Message)
+async def revoke_user_session(
+    session: AsyncSessionDep, current_user: CurrentClaims, session_id: uuid.UUID
+) -> Any:
+    """
+    Sign out one of the current user's sessions. Tokens issued for it stop
+    working within a few seconds on every worker.
+    """
+    user_session = await session.get(UserSession, session_id)
+    if not user_session or user_session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if user_session.revoked_at is None:
+        user_session.revoked_at = datetime.utcnow()
+        user_session.is_current = False
+        session.add(user_session)
+        await session.commit()
+    revoked_sessions.add(user_session.id, user_session.revoked_at)
+    return Message(message="Session revoked")
+
+
+@router.post("/user-sessions/revoke-others", response_model=Message)
+async def revoke_other_user_sessions(
+    session: AsyncSessionDep,
+    current_user: CurrentClaims,
+    token_data: TokenPayloadDep,
+) -> Any:
+    """
+    Sign out all of the current user's sessions except the one making the
+    request.
+    """
+    statement = (
+        update(UserSession)
+        .where(col(UserSession.user_id) == current_user.id)
+        .where(col(UserSession.revoked_at).is_(None))
+        .values(revoked_at=datetime.utcnow(), is_current=False)
+        .returning(col(UserSession.id), col(UserSession.revoked_at))
+    )
+    if token_data.sid:
+        statement = statement.where(col(UserSession.id) != token_data.sid)
+    revoked = (await session.execute(statement)).all()
+    await session.commit()
+    for session_id, revoked_at in revoked:
+        revoked_sessions.add(session_id, revoked_at)
+    return Message(message=f"{len(revoked)} sessions revoked")
+
+
 @router.get("/{user_id}", response_model=UserPublic)
 def read_user_by_id(
     user_id: uuid.UUID, session: SessionDep, current_user: CurrentUser
@@ -399,5 +511,8 @@ def delete_user(
     
     # Now delete the user
     session.delete(user)
+    record_user_deletion(session, user_id)
     session.commit()
+    invalidate_auth_user(user_id)
+    user_auth_states.discard(user_id)
     return Message(message="User deleted successfully")
@@ -1,8 +1,24 @@
+import os
+
 from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
-from app.api.deps import get_current_active_superuser
-from app.models import Message
+from app.api.deps import (
+    AsyncReadOnlySessionDep,
+    get_current_active_superuser,
+    get_current_active_superuser_async,
+)
+from app.core.cache import get_cache_stats
+from app.core.db import get_pool_statuses
+from app.core.outbox import get_outbox_stats
+from app.core.security import hashing_executor
+from app.models import (
+    CacheStatsPublic,
+    EmailOutboxStats,
+    HashingStatsPublic,
+    Message,
+    PoolStatusPublic,
+)
 from app.utils import generate_test_email, send_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -29,3 +45,51 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get(
+    "/db-pool/",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=PoolStatusPublic,
+)
+async def db_pool_status() -> PoolStatusPublic:
+    """
+    Connection pool usage of the worker serving this request.
+    """
+    return PoolStatusPublic(worker_pid=os.getpid(), pools=get_pool_statuses())
+
+
+@router.get(
+    "/cache-stats/",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=CacheStatsPublic,
+)
+async def cache_stats() -> CacheStatsPublic:
+    """
+    Size and hit/miss counters of the in-process caches of this worker.
+    """
+    return CacheStatsPublic(worker_pid=os.getpid(), caches=get_cache_stats())
+
+
+@router.get(
+    "/hashing-stats/",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=HashingStatsPublic,
+)
+async def hashing_stats() -> HashingStatsPublic:
+    """
+    Backlog, rejections and latency of this worker's password hashing threads.
+    """
+    return HashingStatsPublic(worker_pid=os.getpid(), hashing=hashing_executor.stats())
+
+
+@router.get(
+    "/email-outbox/",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=EmailOutboxStats,
+)
+async def email_outbox_stats(session: AsyncReadOnlySessionDep) -> EmailOutboxStats:
+    """
+    Emails queued, retrying, sent and given up on, across all email workers.
+    """
+    return await get_outbox_stats(session)
@@ -0,0 +1,79 @@
+"""
+Time to render renewal digest emails by reading and compiling the template for
+every email, as render_email_template used to, against the shared
+jinja2 Environment of app.utils, with and without auto-reload.
+
+    python -m app.benchmarks.email_templates --emails 5000
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+from typing import Any
+
+from jinja2 import Template
+
+from app.core.config import settings
+from app.core.due_notices import DIGEST_TEXT
+from app.utils import EMAIL_TEMPLATES_DIR, create_email_template_environment
+
+TEMPLATE_NAME = "subscription_digest.html"
+
+
+def contexts(count: int) -> list[dict[str, Any]]:
+    today = date.today()
+    return [
+        {
+            "project_name": settings.PROJECT_NAME,
+            "username": f"user{i}@example.com",
+            "text": DIGEST_TEXT["en"],
+            "renewals": [
+                {
+                    "name": f"Subscription {i}",
+                    "due_date": (today + timedelta(days=i % 30)).isoformat(),
+                    "amount": "9.99 USD",
+                }
+            ],
+            "totals": ["9.99 USD"],
+            "subscription_link": f"{settings.FRONTEND_HOST}/subscriptions/{i}",
+            "support_link": f"{settings.FRONTEND_HOST}/support",
+            "year": today.year,
+        }
+        for i in range(count)
+    ]
+
+
+def render_uncached(context: dict[str, Any]) -> str:
+    template_str = (EMAIL_TEMPLATES_DIR / TEMPLATE_NAME).read_text()
+    return Template(template_str).render(context)
+
+
+def report(name: str, emails: int, seconds: float) -> None:
+    print(
+        f"{name:>28}: {emails / seconds:9.1f} emails/s"
+        f"  {seconds * 1_000_000 / emails:8.1f} us/email"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=5000)
+    args = parser.parse_args()
+    batch = contexts(args.emails)
+
+    start = time.perf_counter()
+    for context in batch:
+        render_uncached(context)
+    report("read + compile per email", len(batch), time.perf_counter() - start)
+
+    for auto_reload in (True, False):
+        environment = create_email_template_environment(auto_reload=auto_reload)
+        start = time.perf_counter()
+        for context in batch:
+            environment.get_template(TEMPLATE_NAME).render(context)
+        name = "shared, auto-reload" if auto_reload else "shared"
+        report(name, len(batch), time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Per-request latency of the hot auth lookups against the configured
+database with server-side prepared statements off (as behind a transaction
+pooler), at psycopg's default threshold, and with POSTGRES_PREPARE_THRESHOLD.
+
+Each simulated request opens a session from the pool and runs what
+authenticated requests run: the user lookup by id from get_current_user and
+crud.get_user_by_email.
+
+    python -m app.benchmarks.prepared_statements --requests 5000
+"""
+
+import argparse
+import statistics
+import time
+
+from sqlalchemy import create_engine
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.core.db import engine_options
+from app.models import User
+
+
+def run(
+    *,
+    prepared_statements: bool,
+    transaction_pooler: bool,
+    requests: int,
+    warmup: int,
+) -> list[float]:
+    bench_engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        **engine_options(
+            prepared_statements=prepared_statements,
+            transaction_pooler=transaction_pooler,
+        ),
+    )
+    email = settings.FIRST_SUPERUSER
+    with Session(bench_engine) as session:
+        user = crud.get_user_by_email(session=session, email=email)
+        assert user, f"{email} not found, run app/initial_data.py first"
+        user_id = user.id
+
+    timings = []
+    for i in range(warmup + requests):
+        start = time.perf_counter()
+        with Session(bench_engine) as session:
+            session.get(User, user_id)
+            crud.get_user_by_email(session=session, email=email)
+        if i >= warmup:
+            timings.append(time.perf_counter() - start)
+    bench_engine.dispose()
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    percentiles = statistics.quantiles(timings, n=100)
+    print(
+        f"{name:>12}: mean {statistics.mean(timings) * 1000:.3f} ms"
+        f"  p50 {percentiles[49] * 1000:.3f} ms"
+        f"  p95 {percentiles[94] * 1000:.3f} ms"
+        f"  p99 {percentiles[98] * 1000:.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    args = parser.parse_args()
+
+    options = {"requests": args.requests, "warmup": args.warmup}
+    unprepared = run(prepared_statements=False, transaction_pooler=True, **options)
+    default = run(prepared_statements=False, transaction_pooler=False, **options)
+    prepared = run(prepared_statements=True, transaction_pooler=False, **options)
+    report("unprepared", unprepared)
+    report("default", default)
+    report("prepared", prepared)
+    for name, timings in (("unprepared", unprepared), ("prepared", prepared)):
+        speedup = statistics.mean(default) / statistics.mean(timings)
+        print(f"{name} vs psycopg default: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
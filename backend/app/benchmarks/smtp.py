@@ -0,0 +1,192 @@
+"""
+Throughput of email delivery with a new SMTP connection per message, as
+send_email used to do, against the pooled transport of app.core.smtp: one
+send at a time, send_many batches, and concurrent async sends.
+
+By default the messages go to a local aiosmtpd server that accepts and
+drops them, with STARTTLS so the handshakes a real server costs are
+included. Use --host/--port to measure against another server instead.
+
+    python -m app.benchmarks.smtp --messages 500
+"""
+
+import argparse
+import asyncio
+import datetime
+import smtplib
+import socket
+import ssl
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from app.core.smtp import AsyncSMTPPool, SMTPPool
+from app.utils import build_email_message
+
+
+def _tls_context() -> ssl.SSLContext:
+    """A server context with a throwaway self-signed certificate."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    with tempfile.TemporaryDirectory() as directory:
+        cert_file = Path(directory) / "cert.pem"
+        key_file = Path(directory) / "key.pem"
+        cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+        key_file.write_bytes(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+        context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+def start_stand_in(port: int, tls: bool) -> Any:
+    from aiosmtpd.controller import Controller
+
+    class Sink:
+        async def handle_DATA(self, server: Any, session: Any, envelope: Any) -> str:
+            return "250 Message accepted for delivery"
+
+    kwargs: dict[str, Any] = {}
+    if tls:
+        kwargs = {"tls_context": _tls_context(), "require_starttls": True}
+    controller = Controller(Sink(), hostname="127.0.0.1", port=port, **kwargs)
+    controller.start()
+    return controller
+
+
+def connector(host: str, port: int, tls: bool) -> Callable[[], smtplib.SMTP]:
+    client_context = ssl.create_default_context()
+    # The stand-in's certificate is self-signed
+    client_context.check_hostname = False
+    client_context.verify_mode = ssl.CERT_NONE
+
+    def connect() -> smtplib.SMTP:
+        conn = smtplib.SMTP(host, port, timeout=10)
+        if tls:
+            conn.starttls(context=client_context)
+        return conn
+
+    return connect
+
+
+def report(name: str, messages: int, seconds: float, connections: int) -> None:
+    print(
+        f"{name:>24}: {messages / seconds:8.1f} msg/s"
+        f"  {seconds * 1000 / messages:7.3f} ms/msg"
+        f"  {connections} connections"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--no-tls", action="store_true")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=25)
+    args = parser.parse_args()
+
+    tls = not args.no_tls
+    controller = None
+    if args.host is None:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            host, port = sock.getsockname()
+        controller = start_stand_in(port, tls)
+    else:
+        host, port = args.host, args.port
+    connect = connector(host, port, tls)
+    messages = [
+        build_email_message(
+            email_to=f"user{i}@example.com",
+            subject="Benchmark",
+            html_content="<p>Hello</p>" * 20,
+        )
+        for i in range(args.messages)
+    ]
+
+    try:
+        start = time.perf_counter()
+        for message in messages:
+            conn = connect()
+            conn.send_message(message)
+            conn.quit()
+        report(
+            "connection per message",
+            len(messages),
+            time.perf_counter() - start,
+            len(messages),
+        )
+
+        pool = SMTPPool(connect=connect, size=args.pool_size, max_messages=10_000)
+        start = time.perf_counter()
+        for message in messages:
+            pool.send(message)
+        report(
+            "pooled send",
+            len(messages),
+            time.perf_counter() - start,
+            pool.connections_opened,
+        )
+        pool.close()
+
+        pool = SMTPPool(connect=connect, size=args.pool_size, max_messages=10_000)
+        start = time.perf_counter()
+        for i in range(0, len(messages), args.batch_size):
+            errors = pool.send_many(messages[i : i + args.batch_size])
+            assert not any(errors), errors
+        report(
+            "pooled send_many",
+            len(messages),
+            time.perf_counter() - start,
+            pool.connections_opened,
+        )
+        pool.close()
+
+        async_pool = AsyncSMTPPool(
+            SMTPPool(connect=connect, size=args.pool_size, max_messages=10_000)
+        )
+
+        async def send_all() -> None:
+            await asyncio.gather(*(async_pool.send(message) for message in messages))
+
+        start = time.perf_counter()
+        asyncio.run(send_all())
+        report(
+            f"async, {args.pool_size} connections",
+            len(messages),
+            time.perf_counter() - start,
+            async_pool.pool.connections_opened,
+        )
+        async_pool.close()
+    finally:
+        if controller is not None:
+            controller.stop()
+
+
+if __name__ == "__main__":
+    main()
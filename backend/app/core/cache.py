@@ -0,0 +1,136 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Generic, TypeVar
+
+from app.core.config import settings
+from app.models import AuthUser, CacheStats, TokenPayload, User
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Caches are per process: a write in one worker only invalidates that
+    worker's entry, the others pick it up when theirs expires.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: K) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return CacheStats(
+                name=self.name,
+                size=len(self._data),
+                maxsize=self.maxsize,
+                ttl=self.ttl,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                hit_rate=self.hits / lookups if lookups else 0.0,
+            )
+
+
+# What authentication needs to know about a user, keyed by the token subject
+auth_user_cache: TTLCache[str, AuthUser] = TTLCache(
+    "auth_user",
+    maxsize=settings.AUTH_USER_CACHE_SIZE,
+    ttl=settings.AUTH_USER_CACHE_TTL_SECONDS,
+)
+
+
+# Digests of recently failed (email, password, stored hash) combinations, so
+# retrying the same wrong password is rejected without running bcrypt. The
+# stored hash is part of the digest: a password change retires the entries.
+failed_login_cache: TTLCache[str, bool] = TTLCache(
+    "failed_login",
+    maxsize=settings.FAILED_LOGIN_CACHE_SIZE,
+    ttl=settings.LOGIN_FAILURE_WINDOW_SECONDS,
+)
+
+
+# Verified access tokens by SHA-256 digest, so a client repeating its bearer
+# token skips the signature check. Each entry is set to expire with its
+# token; the default TTL only bounds tokens without an expiry, which aren't
+# cached. Revocation is checked on every request, cached or not.
+token_cache: TTLCache[bytes, TokenPayload] = TTLCache(
+    "token",
+    maxsize=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
+
+# Token subjects that wrote within the replica stickiness, so their reads
+# go to the primary on this worker even without the sticky cookie or header
+recent_writer_cache: TTLCache[str, bool] = TTLCache(
+    "recent_writer",
+    maxsize=settings.AUTH_USER_CACHE_SIZE,
+    ttl=settings.POSTGRES_REPLICA_STICKINESS_SECONDS,
+)
+
+
+def cache_auth_user(user: User) -> None:
+    """
+    Store a user's current auth record. Used instead of invalidating when the
+    token version changed, so this worker rejects older tokens right away.
+    """
+    auth_user_cache.set(str(user.id), AuthUser.model_validate(user))
+
+
+def invalidate_auth_user(user_id: uuid.UUID) -> None:
+    """Drop a user's cached auth record; call after committing changes to it."""
+    auth_user_cache.pop(str(user_id))
+
+
+def get_cache_stats() -> list[CacheStats]:
+    return [
+        auth_user_cache.stats(),
+        failed_login_cache.stats(),
+        token_cache.stats(),
+        recent_writer_cache.stats(),
+    ]
@@ -34,6 +34,12 @@ class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
     # 60 minutes * 24 hours * 8 days = 8 days
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 30
+    # Access tokens are signed with SECRET_KEY (HS256), or with the key
+    # JWT_SIGNING_KEY_ID from the PEM files in JWT_KEYS_DIR, all of which
+    # are published at /.well-known/jwks.json for other services.
+    JWT_ALGORITHM: Literal["HS256", "RS256", "EdDSA"] = "HS256"
+    JWT_KEYS_DIR: str | None = None
+    JWT_SIGNING_KEY_ID: str | None = None
     FRONTEND_HOST: str
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
 
@@ -68,6 +74,91 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Read replicas as "host" or "host:port", using the primary's credentials
+    # and database name
+    POSTGRES_REPLICA_SERVERS: Annotated[
+        list[str] | str, BeforeValidator(parse_cors)
+    ] = []
+    # Seconds a client keeps reading from the primary after it made a write
+    POSTGRES_REPLICA_STICKINESS_SECONDS: int = 5
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_REPLICA_URIS(self) -> list[PostgresDsn]:
+        uris: list[PostgresDsn] = []
+        for server in self.POSTGRES_REPLICA_SERVERS:
+            host, _, port = server.partition(":")
+            uris.append(
+                MultiHostUrl.build(
+                    scheme="postgresql+psycopg",
+                    username=self.POSTGRES_USER,
+                    password=self.POSTGRES_PASSWORD,
+                    host=host,
+                    port=int(port) if port else self.POSTGRES_PORT,
+                    path=self.POSTGRES_DB,
+                )
+            )
+        return uris
+
+    # Connection pool, applied per engine in every worker process
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_POOL_TIMEOUT: float = 30.0
+    # Seconds after which a connection is replaced, -1 to never recycle
+    POSTGRES_POOL_RECYCLE: int = -1
+    POSTGRES_POOL_PRE_PING: bool = False
+    # psycopg prepares a query server-side once it ran 5 times on a
+    # connection. POSTGRES_PREPARED_STATEMENTS prepares after
+    # POSTGRES_PREPARE_THRESHOLD executions instead. Poolers in transaction
+    # mode (e.g. PgBouncer) can't keep a prepared statement bound to a
+    # client, so POSTGRES_TRANSACTION_POOLER turns preparing off.
+    POSTGRES_PREPARED_STATEMENTS: bool = False
+    POSTGRES_PREPARE_THRESHOLD: int = 1
+    POSTGRES_TRANSACTION_POOLER: bool = False
+    # Prepared statements kept per connection (LRU)
+    POSTGRES_PREPARED_MAX: int = 100
+    # Compiled SQL statements cached per engine
+    POSTGRES_QUERY_CACHE_SIZE: int = 500
+
+    # Per-worker cache of the user fields checked on every authenticated
+    # request. Other workers see a change once their entry expires.
+    AUTH_USER_CACHE_SIZE: int = 10_000
+    AUTH_USER_CACHE_TTL_SECONDS: float = 30.0
+    # Per-worker cache of verified access tokens, each kept until it expires
+    TOKEN_CACHE_SIZE: int = 10_000
+
+    # Threads per worker hashing and checking passwords, and how many calls
+    # may wait for one before requests are turned away with a 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+    # At startup, raise the bcrypt cost as far as one hash fits in this many
+    # milliseconds on the machine, within the rounds limits. 0 disables it.
+    PASSWORD_HASH_BUDGET_MS: int = 250
+    PASSWORD_HASH_MIN_ROUNDS: int = 10
+    PASSWORD_HASH_MAX_ROUNDS: int = 16
+
+    # Failed logins allowed per email and per client IP within the window
+    # before further attempts get a 429 without checking the password.
+    # "postgres" shares the counts between workers, "memory" keeps them per
+    # worker.
+    LOGIN_FAILURE_WINDOW_SECONDS: int = 300
+    LOGIN_MAX_FAILURES_PER_EMAIL: int = 10
+    LOGIN_MAX_FAILURES_PER_IP: int = 100
+    LOGIN_THROTTLE_BACKEND: Literal["memory", "postgres"] = "memory"
+    FAILED_LOGIN_CACHE_SIZE: int = 100_000
+    # Addresses or networks of the reverse proxies in front of the backend.
+    # Only requests from these have their client IP taken from
+    # X-Forwarded-For, everyone else's is the connection's address.
+    TRUSTED_PROXIES: Annotated[list[str] | str, BeforeValidator(parse_cors)] = []
+
+    # How often each worker picks up sessions revoked by the others
+    SESSION_REVOCATION_REFRESH_SECONDS: float = 5.0
+
+    # Rows accepted by one bulk subscription import request
+    SUBSCRIPTION_IMPORT_MAX_ROWS: int = 10_000
+    # Request body cap for the JSON import, checked while it is read
+    SUBSCRIPTION_IMPORT_MAX_BYTES: int = 5 * 1024 * 1024
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -77,6 +168,13 @@ class Settings(BaseSettings):
     # TODO: update type to EmailStr when sqlmodel supports it
     EMAILS_FROM_EMAIL: str | None = None
     EMAILS_FROM_NAME: str | None = None
+    SMTP_TIMEOUT: float = 10.0
+    # Authenticated connections each process keeps open to the SMTP server,
+    # how long one may sit unused, and how many messages it may send before
+    # it's replaced, as servers often cap that
+    SMTP_POOL_SIZE: int = 4
+    SMTP_POOL_MAX_IDLE_SECONDS: float = 60.0
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
 
     @model_validator(mode="after")
     def _set_default_emails_from(self) -> Self:
@@ -86,6 +184,28 @@ class Settings(BaseSettings):
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
 
+    # Emails are queued in the emailoutbox table and sent by the workers of
+    # app.email_worker. Each claims up to a batch of due emails at a time,
+    # and other workers leave a claimed email alone for the lease. Failed
+    # sends are retried with exponential backoff until MAX_ATTEMPTS, sent
+    # emails are deleted after the retention.
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_POLL_SECONDS: float = 2.0
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 300
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 8
+    EMAIL_OUTBOX_BACKOFF_SECONDS: float = 30.0
+    EMAIL_OUTBOX_MAX_BACKOFF_SECONDS: float = 3600.0
+    EMAIL_OUTBOX_RETENTION_DAYS: int = 7
+
+    # Due notices are emailed by app.due_notice_job every interval. Matching
+    # subscriptions are streamed in chunks of FETCH_SIZE rows and handled
+    # BATCH_USERS users per transaction. Reminder days are capped at
+    # MAX_REMINDER_DAYS.
+    DUE_NOTICE_INTERVAL_SECONDS: int = 3600
+    DUE_NOTICE_FETCH_SIZE: int = 5000
+    DUE_NOTICE_BATCH_USERS: int = 500
+    DUE_NOTICE_MAX_REMINDER_DAYS: int = 30
+
     @computed_field  # type: ignore[prop-decorator]
     @property
     def emails_enabled(self) -> bool:
@@ -1,10 +1,152 @@
+import itertools
+import time
+from typing import Any
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
-from app.models import User, UserCreate
+from app.core.metrics import Histogram
+from app.models import HistogramPublic, PoolStatus, User, UserCreate
+
+
+class _InstrumentedPoolMixin:
+    """Record how long checkouts wait for a free connection."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.wait_time = Histogram()
+        self.timeouts = 0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()  # type: ignore[misc, no-any-return]
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.wait_time.observe(time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(
+    *,
+    prepared_statements: bool | None = None,
+    transaction_pooler: bool | None = None,
+) -> dict[str, Any]:
+    if prepared_statements is None:
+        prepared_statements = settings.POSTGRES_PREPARED_STATEMENTS
+    if transaction_pooler is None:
+        transaction_pooler = settings.POSTGRES_TRANSACTION_POOLER
+    # psycopg prepares a query once it ran prepare_threshold times on a
+    # connection, 5 unless set; None turns server-side prepared statements off.
+    connect_args: dict[str, Any] = {}
+    if transaction_pooler:
+        connect_args["prepare_threshold"] = None
+    elif prepared_statements:
+        connect_args["prepare_threshold"] = settings.POSTGRES_PREPARE_THRESHOLD
+    return {
+        "pool_size": settings.POSTGRES_POOL_SIZE,
+        "max_overflow": settings.POSTGRES_MAX_OVERFLOW,
+        "pool_timeout": settings.POSTGRES_POOL_TIMEOUT,
+        "pool_recycle": settings.POSTGRES_POOL_RECYCLE,
+        "pool_pre_ping": settings.POSTGRES_POOL_PRE_PING,
+        "query_cache_size": settings.POSTGRES_QUERY_CACHE_SIZE,
+        "connect_args": connect_args,
+    }
+
+
+def _set_prepared_max(dbapi_connection: Any, _record: ConnectionPoolEntry) -> None:
+    # Async connections arrive wrapped in SQLAlchemy's adapter
+    connection = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+    connection.prepared_max = settings.POSTGRES_PREPARED_MAX
+
+
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedQueuePool,
+    **engine_options(),
+)
+
+# psycopg 3 speaks asyncio natively, so the same postgresql+psycopg URL is used
+# for the async engine. The sync engine above stays available as a fallback
+# for scripts, Alembic and routes that have not been ported yet.
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedAsyncQueuePool,
+    **engine_options(),
+)
+
+replica_engines = [
+    create_engine(str(uri), poolclass=InstrumentedQueuePool, **engine_options())
+    for uri in settings.SQLALCHEMY_REPLICA_URIS
+]
+async_replica_engines = [
+    create_async_engine(
+        str(uri), poolclass=InstrumentedAsyncQueuePool, **engine_options()
+    )
+    for uri in settings.SQLALCHEMY_REPLICA_URIS
+]
+_replica_order = itertools.cycle(range(len(replica_engines)))
+
+for _engine in [engine, *replica_engines]:
+    event.listen(_engine, "connect", _set_prepared_max)
+for _async_engine in [async_engine, *async_replica_engines]:
+    event.listen(_async_engine.sync_engine, "connect", _set_prepared_max)
+
+
+def get_engine(*, read_only: bool = False) -> Engine:
+    """Primary engine, or the next replica for read-only work if any exist."""
+    if read_only and replica_engines:
+        return replica_engines[next(_replica_order)]
+    return engine
+
+
+def get_async_engine(*, read_only: bool = False) -> AsyncEngine:
+    if read_only and async_replica_engines:
+        return async_replica_engines[next(_replica_order)]
+    return async_engine
+
+
+def _pool_status(name: str, engine: Engine) -> PoolStatus:
+    pool = engine.pool
+    assert isinstance(pool, _InstrumentedPoolMixin)
+    assert isinstance(pool, QueuePool)
+    return PoolStatus(
+        name=name,
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        idle=pool.checkedin(),
+        overflow=max(pool.overflow(), 0),
+        max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+        timeouts=pool.timeouts,
+        wait_time=HistogramPublic(**pool.wait_time.snapshot()),
+    )
+
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+def get_pool_statuses() -> list[PoolStatus]:
+    statuses = [
+        _pool_status("primary", engine),
+        _pool_status("primary_async", async_engine.sync_engine),
+    ]
+    for i, (replica, async_replica) in enumerate(
+        zip(replica_engines, async_replica_engines, strict=True)
+    ):
+        statuses.append(_pool_status(f"replica_{i}", replica))
+        statuses.append(_pool_status(f"replica_{i}_async", async_replica.sync_engine))
+    return statuses
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
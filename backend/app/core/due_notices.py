@@ -0,0 +1,343 @@
+import itertools
+import logging
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy import Engine, Row, func, literal, or_, tuple_, update
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.core.outbox import enqueue_email
+from app.models import DueNoticeRun, Subscription, User, UserPreferences
+from app.utils import render_email_template
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_NAME = "subscription_digest.html"
+
+# Digest wording by language code. Languages missing here get English.
+DIGEST_TEXT: dict[str, dict[str, str]] = {
+    "en": {
+        "subject_one": "{project_name} - Upcoming subscription renewal",
+        "subject_many": "{project_name} - {count} upcoming subscription renewals",
+        "title": "Upcoming Renewals",
+        "greeting": "Hello",
+        "intro_one": "One of your subscriptions renews soon.",
+        "intro_many": "{count} of your subscriptions renew soon.",
+        "subscription": "Subscription",
+        "due_date": "Due date",
+        "amount": "Amount",
+        "total": "Total",
+        "manage": "Manage Subscriptions",
+        "help": "For questions about your subscription alerts, please visit our",
+        "help_link": "Help Center",
+        "rights": "All rights reserved.",
+        "date_format": "%B %d, %Y",
+    },
+    "fr": {
+        "subject_one": "{project_name} - Renouvellement d'abonnement à venir",
+        "subject_many": "{project_name} - {count} renouvellements d'abonnement à venir",
+        "title": "Renouvellements à venir",
+        "greeting": "Bonjour",
+        "intro_one": "Un de vos abonnements sera bientôt renouvelé.",
+        "intro_many": "{count} de vos abonnements seront bientôt renouvelés.",
+        "subscription": "Abonnement",
+        "due_date": "Échéance",
+        "amount": "Montant",
+        "total": "Total",
+        "manage": "Gérer les abonnements",
+        "help": "Pour toute question sur vos alertes d'abonnement, consultez notre",
+        "help_link": "Centre d'aide",
+        "rights": "Tous droits réservés.",
+        "date_format": "%d/%m/%Y",
+    },
+    "es": {
+        "subject_one": "{project_name} - Próxima renovación de suscripción",
+        "subject_many": "{project_name} - {count} próximas renovaciones de suscripción",
+        "title": "Próximas renovaciones",
+        "greeting": "Hola",
+        "intro_one": "Una de tus suscripciones se renovará pronto.",
+        "intro_many": "{count} de tus suscripciones se renovarán pronto.",
+        "subscription": "Suscripción",
+        "due_date": "Vencimiento",
+        "amount": "Importe",
+        "total": "Total",
+        "manage": "Gestionar suscripciones",
+        "help": "Si tienes preguntas sobre tus alertas de suscripción, visita nuestro",
+        "help_link": "Centro de ayuda",
+        "rights": "Todos los derechos reservados.",
+        "date_format": "%d/%m/%Y",
+    },
+    "de": {
+        "subject_one": "{project_name} - Anstehende Abo-Verlängerung",
+        "subject_many": "{project_name} - {count} anstehende Abo-Verlängerungen",
+        "title": "Anstehende Verlängerungen",
+        "greeting": "Hallo",
+        "intro_one": "Eines Ihrer Abonnements wird bald verlängert.",
+        "intro_many": "{count} Ihrer Abonnements werden bald verlängert.",
+        "subscription": "Abonnement",
+        "due_date": "Fällig am",
+        "amount": "Betrag",
+        "total": "Summe",
+        "manage": "Abonnements verwalten",
+        "help": "Bei Fragen zu Ihren Abo-Benachrichtigungen besuchen Sie unser",
+        "help_link": "Hilfecenter",
+        "rights": "Alle Rechte vorbehalten.",
+        "date_format": "%d.%m.%Y",
+    },
+    "pt": {
+        "subject_one": "{project_name} - Renovação de assinatura próxima",
+        "subject_many": "{project_name} - {count} renovações de assinatura próximas",
+        "title": "Próximas renovações",
+        "greeting": "Olá",
+        "intro_one": "Uma das suas assinaturas será renovada em breve.",
+        "intro_many": "{count} das suas assinaturas serão renovadas em breve.",
+        "subscription": "Assinatura",
+        "due_date": "Vencimento",
+        "amount": "Valor",
+        "total": "Total",
+        "manage": "Gerenciar assinaturas",
+        "help": "Em caso de dúvidas sobre seus alertas de assinatura, visite nossa",
+        "help_link": "Central de ajuda",
+        "rights": "Todos os direitos reservados.",
+        "date_format": "%d/%m/%Y",
+    },
+}
+
+# The profile page stores language names, the preference default is a code
+LANGUAGE_NAMES = {
+    "english": "en",
+    "french": "fr",
+    "spanish": "es",
+    "german": "de",
+    "portuguese": "pt",
+}
+
+# Currencies without minor units
+ZERO_DECIMAL_CURRENCIES = {"JPY", "KRW", "UGX"}
+
+
+def due_subscriptions(now: datetime) -> Any:
+    """
+    Active subscriptions of users with email notifications and billing
+    updates on, billed within their reminder days and not yet noticed for
+    that billing date, grouped by user.
+    """
+    return (
+        select(
+            Subscription.user_id,
+            User.email,
+            UserPreferences.language,
+            col(UserPreferences.currency).label("preferred_currency"),
+            Subscription.id,
+            Subscription.name,
+            Subscription.amount,
+            Subscription.currency,
+            Subscription.next_billing_date,
+        )
+        .join(User, col(User.id) == Subscription.user_id)
+        .join(UserPreferences, col(UserPreferences.user_id) == Subscription.user_id)
+        .where(col(Subscription.active))
+        .where(col(User.is_active))
+        .where(col(UserPreferences.email_notifications))
+        .where(col(UserPreferences.billing_updates))
+        .where(col(Subscription.next_billing_date) >= now)
+        # A constant bound first, so the scan stays on the range of
+        # ix_subscription_active_next_billing_date
+        .where(
+            col(Subscription.next_billing_date)
+            < now + timedelta(days=settings.DUE_NOTICE_MAX_REMINDER_DAYS)
+        )
+        .where(
+            col(Subscription.next_billing_date)
+            < literal(now)
+            + func.make_interval(0, 0, 0, col(UserPreferences.reminder_days))
+        )
+        .where(
+            or_(
+                col(Subscription.due_notice_sent_for).is_(None),
+                col(Subscription.due_notice_sent_for)
+                != col(Subscription.next_billing_date),
+            )
+        )
+        .order_by(col(Subscription.user_id), col(Subscription.next_billing_date))
+    )
+
+
+def digest_text(language: str | None) -> dict[str, str]:
+    """The digest wording for a language code or name, English if unknown."""
+    code = (language or "en").strip().lower().replace("_", "-").split("-")[0]
+    return DIGEST_TEXT.get(LANGUAGE_NAMES.get(code, code), DIGEST_TEXT["en"])
+
+
+def format_amount(amount: Decimal, currency: str) -> str:
+    places = 0 if currency in ZERO_DECIMAL_CURRENCIES else 2
+    return f"{amount:,.{places}f} {currency}".rstrip()
+
+
+def render_renewal_digest(
+    email_to: str,
+    renewals: Sequence[Any],
+    *,
+    language: str | None = None,
+    currency: str | None = None,
+) -> tuple[str, str]:
+    """
+    Subject and HTML of one email listing all of a user's upcoming renewals,
+    in order, with a total per currency, in the user's language.
+
+    `renewals` have the `id`, `name`, `amount`, `currency` and
+    `next_billing_date` of a subscription. Those without a currency are in
+    the user's preferred `currency`, those without an amount are listed but
+    left out of the totals.
+    """
+    text = digest_text(language)
+    count = len(renewals)
+    totals: defaultdict[str, Decimal] = defaultdict(Decimal)
+    items = []
+    for renewal in renewals:
+        renewal_currency = (renewal.currency or currency or "").upper()
+        amount = None
+        if renewal.amount is not None:
+            # Summed as decimals, floats drift on cents
+            totals[renewal_currency] += Decimal(str(renewal.amount))
+            amount = format_amount(Decimal(str(renewal.amount)), renewal_currency)
+        items.append(
+            {
+                "name": renewal.name,
+                "due_date": renewal.next_billing_date.strftime(text["date_format"]),
+                "amount": amount,
+            }
+        )
+    key = "one" if count == 1 else "many"
+    subject = text[f"subject_{key}"].format(
+        project_name=settings.PROJECT_NAME, count=count
+    )
+    html_content = render_email_template(
+        template_name=TEMPLATE_NAME,
+        context={
+            "project_name": settings.PROJECT_NAME,
+            "username": email_to,
+            "text": {**text, "intro": text[f"intro_{key}"].format(count=count)},
+            "renewals": items,
+            "totals": [
+                format_amount(total, total_currency)
+                for total_currency, total in sorted(totals.items())
+            ],
+            "subscription_link": (
+                f"{settings.FRONTEND_HOST}/subscriptions/{renewals[0].id}"
+                if count == 1
+                else f"{settings.FRONTEND_HOST}/subscriptions"
+            ),
+            "support_link": f"{settings.FRONTEND_HOST}/support",
+            "year": datetime.now().year,
+        },
+    )
+    return subject, html_content
+
+
+def _send_batch(
+    engine: Engine, batch: list[tuple[uuid.UUID, list[Row[Any]]]]
+) -> tuple[int, int]:
+    """
+    Mark the batch's subscriptions as noticed for the billing dates that were
+    read and queue one digest email per user, in one transaction. Subscriptions
+    another run marked already, or whose billing date moved since, are left
+    out, which is what makes the job safe to rerun.
+    """
+    rows = [row for _, user_rows in batch for row in user_rows]
+    with Session(engine) as session:
+        claimed = set(
+            session.exec(  # type: ignore[call-overload]
+                update(Subscription)
+                .where(
+                    tuple_(
+                        col(Subscription.id), col(Subscription.next_billing_date)
+                    ).in_([(row.id, row.next_billing_date) for row in rows])
+                )
+                .where(
+                    or_(
+                        col(Subscription.due_notice_sent_for).is_(None),
+                        col(Subscription.due_notice_sent_for)
+                        != col(Subscription.next_billing_date),
+                    )
+                )
+                .values(due_notice_sent_for=col(Subscription.next_billing_date))
+                .returning(col(Subscription.id))
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+        users = subscriptions = 0
+        for _, user_rows in batch:
+            noticed = [row for row in user_rows if row.id in claimed]
+            if not noticed:
+                continue
+            email_to = noticed[0].email
+            subject, html_content = render_renewal_digest(
+                email_to,
+                noticed,
+                language=noticed[0].language,
+                currency=noticed[0].preferred_currency,
+            )
+            enqueue_email(
+                session, email_to=email_to, subject=subject, html_content=html_content
+            )
+            users += 1
+            subscriptions += len(noticed)
+        session.commit()
+    return users, subscriptions
+
+
+def _user_batches(
+    rows: Iterable[Row[Any]], batch_users: int
+) -> Iterable[list[tuple[uuid.UUID, list[Row[Any]]]]]:
+    batch: list[tuple[uuid.UUID, list[Row[Any]]]] = []
+    for user_id, user_rows in itertools.groupby(rows, key=lambda row: row.user_id):
+        batch.append((user_id, list(user_rows)))
+        if len(batch) >= batch_users:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def send_due_notices(
+    engine: Engine,
+    read_engine: Engine | None = None,
+    now: datetime | None = None,
+    fetch_size: int = settings.DUE_NOTICE_FETCH_SIZE,
+    batch_users: int = settings.DUE_NOTICE_BATCH_USERS,
+) -> DueNoticeRun:
+    """
+    Queue a renewal digest email for every user with subscriptions coming
+    up, so emails and SMTP traffic grow with users, not subscriptions.
+
+    The matches are read with a server-side cursor, `fetch_size` rows at a
+    time, on `read_engine` (a replica is fine), and handled `batch_users`
+    users per transaction on `engine`, so memory stays bounded however many
+    subscriptions there are. Emails go out through the outbox.
+    """
+    start = time.perf_counter()
+    users = subscriptions = 0
+    if not settings.emails_enabled:
+        logger.warning("Emails are not configured, not sending due notices")
+        return DueNoticeRun(users=0, subscriptions=0, seconds=0.0)
+    now = now or datetime.utcnow()
+    with Session(read_engine or engine) as read_session:
+        rows = read_session.execute(
+            due_subscriptions(now).execution_options(yield_per=fetch_size)
+        )
+        for batch in _user_batches(rows, batch_users):
+            batch_users_sent, batch_subscriptions = _send_batch(engine, batch)
+            users += batch_users_sent
+            subscriptions += batch_subscriptions
+    return DueNoticeRun(
+        users=users,
+        subscriptions=subscriptions,
+        seconds=time.perf_counter() - start,
+    )
@@ -1,15 +1,20 @@
+import math
+import re
+import threading
+import time
+from collections.abc import Callable, Mapping
 from typing import Any, Dict
-import os
 
-from google.oauth2 import id_token
-from google.auth.transport import requests
+import httpx
+import jwt
+from google.auth import jwt as google_jwt
 from google_auth_oauthlib.flow import Flow
 from fastapi import HTTPException
 
 from app.core.config import settings
 
-# Allow insecure transport for local development
-os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
+GOOGLE_AUTH_URI = "https://accounts.google.com/o/oauth2/auth"
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
 
 
 def create_google_oauth_flow() -> Flow:
@@ -24,8 +29,8 @@ def create_google_oauth_flow() -> Flow:
     client_config = {
         "client_id": settings.GOOGLE_CLIENT_ID,
         "client_secret": settings.GOOGLE_CLIENT_SECRET,
-        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-        "token_uri": "https://oauth2.googleapis.com/token",
+        "auth_uri": GOOGLE_AUTH_URI,
+        "token_uri": GOOGLE_TOKEN_URI,
     }
     
     # Create the flow with explicit redirect_uri
@@ -42,11 +47,152 @@ def create_google_oauth_flow() -> Flow:
     return flow
 
 
-def verify_google_token(token: str) -> Dict[str, Any]:
+_async_http_client: httpx.AsyncClient | None = None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Pooled client for calls to Google from async routes. Created on first
+    use, inside the running event loop, and closed with the app.
+    """
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=10),
+        )
+    return _async_http_client
+
+
+async def close_async_http_client() -> None:
+    global _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+
+
+async def exchange_google_code(code: str) -> Dict[str, Any]:
+    """
+    Trade an authorization code from the OAuth callback for Google's tokens,
+    without blocking the event loop.
+    """
+    if not all([settings.GOOGLE_CLIENT_ID, settings.GOOGLE_CLIENT_SECRET, settings.GOOGLE_REDIRECT_URI]):
+        raise HTTPException(
+            status_code=500,
+            detail="Google OAuth settings are not properly configured"
+        )
+    try:
+        response = await get_async_http_client().post(
+            GOOGLE_TOKEN_URI,
+            data={
+                "grant_type": "authorization_code",
+                "code": code,
+                "client_id": settings.GOOGLE_CLIENT_ID,
+                "client_secret": settings.GOOGLE_CLIENT_SECRET,
+                "redirect_uri": settings.GOOGLE_REDIRECT_URI,
+            },
+            headers={"Accept": "application/json"},
+        )
+        response.raise_for_status()
+        tokens: Dict[str, Any] = response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Failed to fetch token: {str(e)}"
+        )
+    if "id_token" not in tokens:
+        raise HTTPException(
+            status_code=400, detail="Failed to fetch token: no id_token returned"
+        )
+    return tokens
+
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+
+# Takes the certs URL, returns PEM certificates by key id and for how many
+# seconds they may be cached
+CertFetcher = Callable[[str], tuple[Dict[str, str], float]]
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+# Reused across logins so the TLS connection to Google stays open
+_http_client = httpx.Client(
+    timeout=10.0, limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+)
+
+
+def _cache_lifetime(headers: Mapping[str, str]) -> float:
+    cache_control = headers.get("cache-control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0.0
+    match = _MAX_AGE.search(cache_control)
+    if not match:
+        return 0.0
+    return max(int(match.group(1)) - int(headers.get("age", 0)), 0)
+
+
+def fetch_google_certs(url: str) -> tuple[Dict[str, str], float]:
+    response = _http_client.get(url)
+    response.raise_for_status()
+    return response.json(), _cache_lifetime(response.headers)
+
+
+class GoogleCertStore:
+    """
+    Google's token signing certificates, kept for as long as its
+    Cache-Control allows.
+
+    Google rotates keys, publishing new ones ahead of use. A token signed with
+    a key id not seen yet triggers an early refetch, at most once per
+    `min_refresh_interval` so bogus key ids can't hammer the endpoint.
+    """
+
+    def __init__(
+        self,
+        url: str = GOOGLE_CERTS_URL,
+        fetcher: CertFetcher = fetch_google_certs,
+        min_refresh_interval: float = 60.0,
+    ) -> None:
+        self.url = url
+        self.fetcher = fetcher
+        self.min_refresh_interval = min_refresh_interval
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = -math.inf
+        # Held while fetching, so concurrent logins share one request
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def get(self, key_id: str | None = None) -> Dict[str, str]:
+        with self._lock:
+            now = time.monotonic()
+            unknown_key = (
+                key_id is not None
+                and key_id not in self._certs
+                and now - self._fetched_at >= self.min_refresh_interval
+            )
+            if now >= self._expires_at or unknown_key:
+                certs, max_age = self.fetcher(self.url)
+                self.fetches += 1
+                self._certs = certs
+                self._fetched_at = now
+                self._expires_at = now + max_age
+            return self._certs
+
+
+google_certs = GoogleCertStore()
+
+
+def verify_google_token(
+    token: str, cert_store: GoogleCertStore = google_certs
+) -> Dict[str, Any]:
     """Verify a Google ID token and return the user info."""
     try:
-        idinfo = id_token.verify_oauth2_token(
-            token, requests.Request(), settings.GOOGLE_CLIENT_ID
+        key_id = jwt.get_unverified_header(token).get("kid")
+        idinfo = google_jwt.decode(
+            token,
+            certs=cert_store.get(key_id),
+            audience=settings.GOOGLE_CLIENT_ID,
         )
 
         if idinfo["iss"] not in ["accounts.google.com", "https://accounts.google.com"]:
@@ -0,0 +1,114 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+    Ed25519PrivateKey,
+    Ed25519PublicKey,
+)
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_private_key,
+    load_pem_public_key,
+)
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+from app.core.config import settings
+
+PrivateKey = RSAPrivateKey | Ed25519PrivateKey
+PublicKey = RSAPublicKey | Ed25519PublicKey
+
+_KEY_TYPES: dict[str, tuple[type[PrivateKey], type[PublicKey]]] = {
+    "RS256": (RSAPrivateKey, RSAPublicKey),
+    "EdDSA": (Ed25519PrivateKey, Ed25519PublicKey),
+}
+
+
+class TokenKeys:
+    """
+    The keys access tokens are signed and verified with.
+
+    With HS256 that is SECRET_KEY, which only this backend can verify with.
+    With RS256 or EdDSA, every `<kid>.pem` in `keys_dir` is a verification
+    key and is published in the JWKS, and the private key named by
+    `signing_kid` signs new tokens, its kid in the token header. Retired
+    keys can be left as public keys until their tokens have expired.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        secret: str,
+        keys_dir: str | None = None,
+        signing_kid: str | None = None,
+    ) -> None:
+        self.algorithm = algorithm
+        self._secret = secret
+        self._signing_kid = signing_kid
+        self._signing_key: PrivateKey | None = None
+        self._public_keys: dict[str, PublicKey] = {}
+        if algorithm == "HS256":
+            self.jwks_json = json.dumps({"keys": []}).encode()
+            return
+        if not keys_dir or not signing_kid:
+            raise ValueError(
+                f"JWT_KEYS_DIR and JWT_SIGNING_KEY_ID are required for {algorithm}"
+            )
+        private_type, public_type = _KEY_TYPES[algorithm]
+        for path in sorted(Path(keys_dir).glob("*.pem")):
+            data = path.read_bytes()
+            if b"PRIVATE KEY" in data:
+                private_key = load_pem_private_key(data, password=None)
+                if not isinstance(private_key, private_type):
+                    raise ValueError(f"{path} is not a key for {algorithm}")
+                if path.stem == signing_kid:
+                    self._signing_key = private_key
+                public_key = private_key.public_key()
+            else:
+                public_key = load_pem_public_key(data)  # type: ignore[assignment]
+            if not isinstance(public_key, public_type):
+                raise ValueError(f"{path} is not a key for {algorithm}")
+            self._public_keys[path.stem] = public_key
+        if self._signing_key is None:
+            raise ValueError(f"No private key {signing_kid}.pem in {keys_dir}")
+        # Keys only change with a restart, so the document is built once
+        self.jwks_json = json.dumps({"keys": self._jwks()}).encode()
+
+    def _jwks(self) -> list[dict[str, Any]]:
+        keys = []
+        for kid, public_key in self._public_keys.items():
+            if self.algorithm == "RS256":
+                jwk = RSAAlgorithm.to_jwk(public_key, as_dict=True)
+            else:
+                jwk = OKPAlgorithm.to_jwk(public_key, as_dict=True)
+            keys.append({**jwk, "kid": kid, "alg": self.algorithm, "use": "sig"})
+        return keys
+
+    def encode(self, payload: dict[str, Any]) -> str:
+        if self._signing_key is None:
+            return jwt.encode(payload, self._secret, algorithm=self.algorithm)
+        return jwt.encode(
+            payload,
+            self._signing_key,
+            algorithm=self.algorithm,
+            headers={"kid": self._signing_kid},
+        )
+
+    def decode(self, token: str) -> dict[str, Any]:
+        """Verify a token, raising jwt.InvalidTokenError if it isn't valid."""
+        if self.algorithm == "HS256":
+            return jwt.decode(token, self._secret, algorithms=[self.algorithm])
+        kid = jwt.get_unverified_header(token).get("kid")
+        public_key = self._public_keys.get(kid) if isinstance(kid, str) else None
+        if public_key is None:
+            raise jwt.InvalidTokenError(f"Unknown key id: {kid}")
+        return jwt.decode(token, public_key, algorithms=[self.algorithm])
+
+
+token_keys = TokenKeys(
+    settings.JWT_ALGORITHM,
+    settings.SECRET_KEY,
+    keys_dir=settings.JWT_KEYS_DIR,
+    signing_kid=settings.JWT_SIGNING_KEY_ID,
+)
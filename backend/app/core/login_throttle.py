@@ -0,0 +1,203 @@
+import ipaddress
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from typing import Protocol
+
+from fastapi import HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col, delete, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import LoginFailure
+
+_trusted_proxies = [
+    ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES
+]
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_proxies)
+
+
+def client_ip(request: Request) -> str | None:
+    """
+    The address the request came from. Behind trusted proxies, that's the
+    last address in X-Forwarded-For that isn't one of them: the entries
+    before it could have been sent by the client itself.
+    """
+    if request.client is None:
+        return None
+    address = request.client.host
+    if not _is_trusted_proxy(address):
+        return address
+    forwarded = request.headers.get("x-forwarded-for", "")
+    for hop in reversed([hop.strip() for hop in forwarded.split(",")]):
+        if not hop:
+            continue
+        address = hop
+        if not _is_trusted_proxy(hop):
+            break
+    return address
+
+
+class LoginFailureBackend(Protocol):
+    """Where failed logins are counted, per throttling key."""
+
+    async def counts(self, keys: Sequence[str]) -> dict[str, int]: ...
+
+    async def record(self, keys: Sequence[str]) -> None: ...
+
+    async def clear(self, keys: Sequence[str]) -> None: ...
+
+
+class MemoryLoginFailures:
+    """
+    Sliding-window counts in this worker's memory. The least recently failed
+    keys are dropped past `max_keys`, so a flood of random emails can't grow
+    it without bound.
+    """
+
+    def __init__(self, window: float, max_keys: int = 100_000) -> None:
+        self.window = window
+        self.max_keys = max_keys
+        self._failures: OrderedDict[str, deque[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float) -> deque[float] | None:
+        times = self._failures.get(key)
+        if times is None:
+            return None
+        while times and times[0] <= now - self.window:
+            times.popleft()
+        if not times:
+            del self._failures[key]
+            return None
+        return times
+
+    async def counts(self, keys: Sequence[str]) -> dict[str, int]:
+        now = time.monotonic()
+        with self._lock:
+            return {key: len(self._live(key, now) or ()) for key in keys}
+
+    async def record(self, keys: Sequence[str]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                times = self._live(key, now) or deque()
+                times.append(now)
+                self._failures[key] = times
+                self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    async def clear(self, keys: Sequence[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._failures.pop(key, None)
+
+
+class PostgresLoginFailures:
+    """Counts shared by all workers, one loginfailure row per failure."""
+
+    def __init__(self, engine: AsyncEngine, window: float) -> None:
+        self.engine = engine
+        self.window = window
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.window)
+
+    async def counts(self, keys: Sequence[str]) -> dict[str, int]:
+        statement = (
+            select(LoginFailure.key, func.count())
+            .where(col(LoginFailure.key).in_(keys))
+            .where(col(LoginFailure.failed_at) > self._cutoff())
+            .group_by(LoginFailure.key)
+        )
+        async with AsyncSession(self.engine) as session:
+            found = dict((await session.exec(statement)).all())
+        return {key: found.get(key, 0) for key in keys}
+
+    async def record(self, keys: Sequence[str]) -> None:
+        async with AsyncSession(self.engine) as session:
+            # Rows past the window are never counted again; dropping the
+            # key's old ones here keeps the table at about the live size.
+            await session.exec(  # type: ignore[call-overload]
+                delete(LoginFailure)
+                .where(col(LoginFailure.key).in_(keys))
+                .where(col(LoginFailure.failed_at) <= self._cutoff())
+            )
+            session.add_all(LoginFailure(key=key) for key in keys)
+            await session.commit()
+
+    async def clear(self, keys: Sequence[str]) -> None:
+        async with AsyncSession(self.engine) as session:
+            await session.exec(  # type: ignore[call-overload]
+                delete(LoginFailure).where(col(LoginFailure.key).in_(keys))
+            )
+            await session.commit()
+
+
+class LoginThrottle:
+    """
+    Turns away logins for an email or client IP with too many recent
+    failures, before any password hashing is spent on them.
+    """
+
+    def __init__(
+        self,
+        backend: LoginFailureBackend,
+        window: int,
+        max_per_email: int,
+        max_per_ip: int,
+    ) -> None:
+        self.backend = backend
+        self.window = window
+        self.max_per_email = max_per_email
+        self.max_per_ip = max_per_ip
+
+    @staticmethod
+    def _keys(email: str, ip: str | None) -> tuple[str, str]:
+        return f"email:{email.strip().lower()}", f"ip:{ip or 'unknown'}"
+
+    async def check(self, email: str, ip: str | None) -> None:
+        email_key, ip_key = self._keys(email, ip)
+        counts = await self.backend.counts([email_key, ip_key])
+        if counts[email_key] >= self.max_per_email or counts[ip_key] >= self.max_per_ip:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many failed login attempts, try again later",
+                headers={"Retry-After": str(self.window)},
+            )
+
+    async def record_failure(self, email: str, ip: str | None) -> None:
+        await self.backend.record(self._keys(email, ip))
+
+    async def record_success(self, email: str, ip: str | None) -> None:
+        # The IP may be shared (NAT, office), so only the account is cleared
+        email_key, _ = self._keys(email, ip)
+        await self.backend.clear([email_key])
+
+
+def _backend() -> LoginFailureBackend:
+    if settings.LOGIN_THROTTLE_BACKEND == "postgres":
+        return PostgresLoginFailures(
+            async_engine, window=settings.LOGIN_FAILURE_WINDOW_SECONDS
+        )
+    return MemoryLoginFailures(window=settings.LOGIN_FAILURE_WINDOW_SECONDS)
+
+
+login_throttle = LoginThrottle(
+    _backend(),
+    window=settings.LOGIN_FAILURE_WINDOW_SECONDS,
+    max_per_email=settings.LOGIN_MAX_FAILURES_PER_EMAIL,
+    max_per_ip=settings.LOGIN_MAX_FAILURES_PER_IP,
+)
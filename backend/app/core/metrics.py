@@ -0,0 +1,50 @@
+import bisect
+import threading
+from collections.abc import Sequence
+from typing import Any
+
+# Upper bounds in seconds, from a free pool checkout up to a pool timeout
+DEFAULT_LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram, Prometheus style."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self._bounds = sorted(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        buckets: dict[str, int] = {}
+        cumulative = 0
+        for bound, count in zip(self._bounds, counts[:-1], strict=True):
+            cumulative += count
+            buckets[f"{bound:g}"] = cumulative
+        cumulative += counts[-1]
+        buckets["+Inf"] = cumulative
+        return {"buckets": buckets, "count": cumulative, "sum": total}
@@ -0,0 +1,215 @@
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+
+from sqlalchemy import Engine
+from sqlmodel import Session, col, delete, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+from app.models import EmailOutbox, EmailOutboxStats, EmailWorkerStats
+from app.utils import send_email
+
+logger = logging.getLogger(__name__)
+
+# From one SMTP round trip up to an email that waited out several retries
+DELIVERY_LAG_BUCKETS = (1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0, 4 * 3600.0)
+
+
+def enqueue_email(
+    session: Session | AsyncSession,
+    *,
+    email_to: str,
+    subject: str = "",
+    html_content: str = "",
+) -> EmailOutbox | None:
+    """
+    Queue an email in `session`, to be sent once the session commits.
+
+    Nothing is queued when email isn't configured, like the routes that
+    skip sending in that case.
+    """
+    if not settings.emails_enabled:
+        logger.warning("Emails are not configured, not sending %r", subject)
+        return None
+    email = EmailOutbox(email_to=email_to, subject=subject, html_content=html_content)
+    session.add(email)
+    return email
+
+
+async def get_outbox_stats(session: AsyncSession) -> EmailOutboxStats:
+    statement = select(
+        EmailOutbox.status,
+        func.count(),
+        func.count().filter(col(EmailOutbox.attempts) > 0),
+        func.min(EmailOutbox.created_at),
+    ).group_by(EmailOutbox.status)
+    rows = {row[0]: row[1:] for row in (await session.exec(statement)).all()}
+    pending, retrying, oldest = rows.get("pending", (0, 0, None))
+    return EmailOutboxStats(
+        pending=pending,
+        retrying=retrying,
+        sent=rows.get("sent", (0,))[0],
+        failed=rows.get("failed", (0,))[0],
+        oldest_pending_seconds=(
+            (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+        ),
+    )
+
+
+class OutboxWorker:
+    """
+    Delivers the emails queued in the outbox.
+
+    Any number of these can run side by side, in one or more processes: a
+    batch is claimed with FOR UPDATE SKIP LOCKED, so workers never wait on
+    each other, and leased by moving its next attempt past the lease. The
+    row locks are released before any SMTP traffic. An email whose worker
+    died mid-batch is picked up again once its lease runs out, so delivery
+    is at least once.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        send: Callable[..., None] = send_email,
+        batch_size: int = settings.EMAIL_OUTBOX_BATCH_SIZE,
+        lease: float = settings.EMAIL_OUTBOX_LEASE_SECONDS,
+        max_attempts: int = settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+        backoff: float = settings.EMAIL_OUTBOX_BACKOFF_SECONDS,
+        max_backoff: float = settings.EMAIL_OUTBOX_MAX_BACKOFF_SECONDS,
+    ) -> None:
+        self.engine = engine
+        self.send = send
+        self.batch_size = batch_size
+        self.lease = timedelta(seconds=lease)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.send_duration = Histogram()
+        self.delivery_lag = Histogram(DELIVERY_LAG_BUCKETS)
+
+    def retry_delay(self, attempts: int) -> float:
+        """Exponential backoff with jitter, so failed emails don't retry in step."""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def claim(self) -> list[EmailOutbox]:
+        now = datetime.utcnow()
+        statement = (
+            select(EmailOutbox)
+            .where(EmailOutbox.status == "pending")
+            .where(col(EmailOutbox.next_attempt_at) <= now)
+            .order_by(col(EmailOutbox.next_attempt_at))
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        with Session(self.engine, expire_on_commit=False) as session:
+            emails = list(session.exec(statement).all())
+            for email in emails:
+                # Counted on claim, so an email that keeps killing its
+                # worker still runs out of attempts
+                email.attempts += 1
+                email.next_attempt_at = now + self.lease
+            session.commit()
+        return emails
+
+    def _deliver(self, email: EmailOutbox) -> None:
+        start = time.perf_counter()
+        try:
+            self.send(
+                email_to=email.email_to,
+                subject=email.subject,
+                html_content=email.html_content,
+            )
+        except Exception as e:
+            email.last_error = f"{type(e).__name__}: {e}"[:1000]
+            if email.attempts >= self.max_attempts:
+                email.status = "failed"
+                self.failed += 1
+                logger.error("Giving up on email %s: %s", email.id, email.last_error)
+            else:
+                delay = self.retry_delay(email.attempts)
+                email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                self.retried += 1
+                logger.warning(
+                    "Email %s failed, retrying in %.0fs: %s",
+                    email.id,
+                    delay,
+                    email.last_error,
+                )
+        else:
+            email.status = "sent"
+            email.sent_at = datetime.utcnow()
+            self.sent += 1
+            self.delivery_lag.observe(
+                (email.sent_at - email.created_at).total_seconds()
+            )
+        finally:
+            self.send_duration.observe(time.perf_counter() - start)
+
+    def process_batch(self) -> int:
+        """Claim and deliver one batch, returning how many emails it had."""
+        emails = self.claim()
+        if not emails:
+            return 0
+        for email in emails:
+            self._deliver(email)
+        with Session(self.engine) as session:
+            for email in emails:
+                session.add(email)
+            session.commit()
+        return len(emails)
+
+    def purge_sent(self, retention: timedelta) -> None:
+        cutoff = datetime.utcnow() - retention
+        with Session(self.engine) as session:
+            session.exec(  # type: ignore[call-overload]
+                delete(EmailOutbox)
+                .where(EmailOutbox.status == "sent")
+                .where(col(EmailOutbox.sent_at) < cutoff)
+            )
+            session.commit()
+
+    def run(
+        self,
+        stop: threading.Event,
+        poll_interval: float = settings.EMAIL_OUTBOX_POLL_SECONDS,
+        report_interval: float = 60.0,
+    ) -> None:
+        """Deliver until `stop` is set, waiting between polls when idle."""
+        last_report = time.monotonic()
+        while not stop.is_set():
+            try:
+                processed = self.process_batch()
+            except Exception:
+                logger.exception("Processing the email outbox failed")
+                processed = 0
+            if time.monotonic() - last_report >= report_interval:
+                logger.info("Email worker stats: %s", self.stats().model_dump_json())
+                try:
+                    self.purge_sent(
+                        timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)
+                    )
+                except Exception:
+                    logger.exception("Purging sent emails failed")
+                last_report = time.monotonic()
+            # A full batch means more are likely due right away
+            if processed < self.batch_size:
+                stop.wait(poll_interval)
+
+    def stats(self) -> EmailWorkerStats:
+        return EmailWorkerStats(
+            sent=self.sent,
+            retried=self.retried,
+            failed=self.failed,
+            send_duration=self.send_duration.snapshot(),
+            delivery_lag=self.delivery_lag.snapshot(),
+        )
@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session, col, delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import DeletedUser, User, UserSession
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives."""
+
+    def __init__(self, bits: int = 1 << 20, hashes: int = 7) -> None:
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray(bits // 8)
+
+    def _positions(self, key: bytes) -> list[int]:
+        digest = hashlib.blake2b(key, digest_size=4 * self.hashes).digest()
+        return [
+            int.from_bytes(digest[i : i + 4], "little") % self.bits
+            for i in range(0, len(digest), 4)
+        ]
+
+    def add(self, key: bytes) -> None:
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(
+            self._array[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class RevokedSessions:
+    """
+    This worker's copy of the revoked session ids, checked on every request.
+
+    The bloom filter answers the common "not revoked" case; its rare false
+    positives are settled by the exact set. Only sessions revoked within the
+    token lifetime are kept: tokens of sessions revoked earlier have expired.
+    New revocations are pulled from the database every few seconds.
+    """
+
+    # Re-read a little before the last seen revocation, to catch rows from
+    # transactions that committed after a later one was already read
+    OVERLAP = timedelta(seconds=5)
+
+    def __init__(self, retention: timedelta) -> None:
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._revoked: dict[uuid.UUID, datetime] = {}
+        self._bloom = BloomFilter()
+        self._watermark = datetime.utcnow() - retention
+        self.refreshes = 0
+
+    def add(self, session_id: uuid.UUID, revoked_at: datetime) -> None:
+        with self._lock:
+            self._revoked[session_id] = revoked_at
+            self._bloom.add(session_id.bytes)
+
+    def is_revoked(self, session_id: uuid.UUID) -> bool:
+        return session_id.bytes in self._bloom and session_id in self._revoked
+
+    async def refresh(self, engine: AsyncEngine) -> None:
+        statement = (
+            select(UserSession.id, UserSession.revoked_at)
+            .where(col(UserSession.revoked_at) > self._watermark - self.OVERLAP)
+            .order_by(col(UserSession.revoked_at))
+        )
+        async with AsyncSession(engine) as session:
+            rows = (await session.exec(statement)).all()
+        for session_id, revoked_at in rows:
+            self.add(session_id, revoked_at)
+        if rows:
+            self._watermark = max(self._watermark, rows[-1][1])
+        self._prune()
+        self.refreshes += 1
+
+    def _prune(self) -> None:
+        cutoff = datetime.utcnow() - self.retention
+        with self._lock:
+            if not any(revoked_at < cutoff for revoked_at in self._revoked.values()):
+                return
+            # Bloom filters can't forget, so rebuild from what is left
+            self._revoked = {
+                session_id: revoked_at
+                for session_id, revoked_at in self._revoked.items()
+                if revoked_at >= cutoff
+            }
+            self._bloom = BloomFilter()
+            for session_id in self._revoked:
+                self._bloom.add(session_id.bytes)
+
+    async def run(self, engine: AsyncEngine, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(engine)
+            except Exception:
+                logger.exception("Refreshing revoked sessions failed")
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+class AuthState(NamedTuple):
+    token_version: int
+    is_active: bool
+    is_admin: bool
+
+
+class UserAuthStates:
+    """
+    This worker's copy of every user's token version and flags, so claims in
+    access tokens can be checked without a lookup.
+
+    Entries only go away with the user: the first refresh loads all users,
+    later ones pull the users whose `auth_changed_at` moved, which every
+    token version bump sets, and drop the users deleted since, see
+    `record_user_deletion`. A user missing here, one created since the last
+    refresh or any user before the first refresh, has to be looked up.
+
+    That is a copy of every user in every worker, about 250 bytes each, so
+    some 250 MB per worker for a million users.
+    """
+
+    OVERLAP = RevokedSessions.OVERLAP
+
+    def __init__(self) -> None:
+        self._states: dict[uuid.UUID, AuthState] = {}
+        self._watermark: datetime | None = None
+        # Users deleted before this worker loaded the others aren't loaded
+        self._deleted_watermark = datetime.utcnow()
+        self.refreshes = 0
+
+    def set(self, user_id: uuid.UUID, state: AuthState) -> None:
+        self._states[user_id] = state
+
+    def get(self, user_id: uuid.UUID) -> AuthState | None:
+        return self._states.get(user_id)
+
+    def discard(self, user_id: uuid.UUID) -> None:
+        self._states.pop(user_id, None)
+
+    async def refresh(self, engine: AsyncEngine) -> None:
+        statement = select(
+            User.id,
+            User.token_version,
+            User.is_active,
+            User.is_admin,
+            User.auth_changed_at,
+        ).order_by(col(User.auth_changed_at))
+        if self._watermark is not None:
+            statement = statement.where(
+                col(User.auth_changed_at) > self._watermark - self.OVERLAP
+            )
+        # Read after the users, so a user deleted in between is dropped too
+        deleted_statement = (
+            select(DeletedUser.id, DeletedUser.deleted_at)
+            .where(col(DeletedUser.deleted_at) > self._deleted_watermark - self.OVERLAP)
+            .order_by(col(DeletedUser.deleted_at))
+        )
+        async with AsyncSession(engine) as session:
+            rows = (await session.exec(statement)).all()
+            deleted = (await session.exec(deleted_statement)).all()
+        for user_id, token_version, is_active, is_admin, _ in rows:
+            self._states[user_id] = AuthState(token_version, is_active, is_admin)
+        for user_id, _ in deleted:
+            self.discard(user_id)
+        if rows:
+            self._watermark = max(self._watermark or rows[-1][4], rows[-1][4])
+        elif self._watermark is None:
+            self._watermark = datetime.utcnow()
+        if deleted:
+            self._deleted_watermark = max(self._deleted_watermark, deleted[-1][1])
+        self.refreshes += 1
+
+    async def run(self, engine: AsyncEngine, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(engine)
+            except Exception:
+                logger.exception("Refreshing user auth states failed")
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+
+revoked_sessions = RevokedSessions(
+    retention=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+)
+
+
+user_auth_states = UserAuthStates()
+
+
+def record_user_deletion(session: Session, user_id: uuid.UUID) -> None:
+    """
+    Make a user's deletion known to every worker; call in the transaction
+    that deletes the user. After commit, `user_auth_states.discard` it on
+    this worker.
+
+    Other workers drop the user within seconds, so a day of deletions is
+    more than they need; older ones are cleared here as they go.
+    """
+    session.exec(  # type: ignore[call-overload]
+        delete(DeletedUser).where(
+            col(DeletedUser.deleted_at) < datetime.utcnow() - timedelta(days=1)
+        )
+    )
+    session.add(DeletedUser(id=user_id))
+
+
+async def _follow_revocations(interval: float) -> None:
+    await asyncio.gather(
+        revoked_sessions.run(async_engine, interval),
+        user_auth_states.run(async_engine, interval),
+    )
+
+
+async def start_revocation_refresh() -> asyncio.Task[None]:
+    """
+    Load the revoked sessions and user auth states, then keep following
+    new revocations and token version changes.
+    """
+    for revocations in (revoked_sessions, user_auth_states):
+        try:
+            await revocations.refresh(async_engine)
+        except Exception:
+            logger.exception(
+                "Loading %s failed, retrying in background",
+                type(revocations).__name__,
+            )
+    return asyncio.create_task(
+        _follow_revocations(settings.SESSION_REVOCATION_REFRESH_SECONDS)
+    )
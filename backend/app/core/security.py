@@ -1,22 +1,56 @@
+import asyncio
+import hashlib
+import hmac
+import math
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
-import jwt
+from fastapi import HTTPException
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
 
 from app.core.config import settings
+from app.core.jwt_keys import token_keys
+from app.core.metrics import Histogram
+from app.models import (
+    AuthUser,
+    HashCalibration,
+    HashingStats,
+    HistogramPublic,
+    User,
+)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+# Password reset and email verification tokens; access tokens are signed
+# as configured in app.core.jwt_keys
 ALGORITHM = "HS256"
 
 
-def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
+def create_access_token(
+    subject: str | Any,
+    expires_delta: timedelta,
+    claims: dict[str, Any] | None = None,
+) -> str:
     expire = datetime.now(timezone.utc) + expires_delta
-    to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject)}
+    return token_keys.encode(to_encode)
+
+
+def user_claims(user: User | AuthUser) -> dict[str, Any]:
+    """Claims that let requests be authorized without loading the user."""
+    return {
+        "ver": user.token_version,
+        "email": user.email,
+        "is_active": user.is_active,
+        "is_verified": user.is_verified,
+        "is_admin": user.is_admin,
+    }
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -25,3 +59,138 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+def failed_login_key(email: str, password: str, hashed_password: str) -> str:
+    """Keyed digest of a login attempt, so no password is kept in memory."""
+    message = "\0".join((email, password, hashed_password)).encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True for hashes made with a weaker cost than the current one."""
+    return pwd_context.needs_update(hashed_password)
+
+
+def calibrate_password_hashing(
+    budget_seconds: float,
+    min_rounds: int,
+    max_rounds: int,
+    context: CryptContext = pwd_context,
+) -> HashCalibration:
+    """
+    Pick the highest bcrypt cost whose hash fits in `budget_seconds` here,
+    and make it the context's default and minimum. Existing hashes below it
+    then report needs_update and get upgraded on the next login.
+    """
+    # Every extra round doubles the work, so one timing at the lowest cost
+    # predicts the rest. Best of three to skip warm-up noise.
+    base = min(_time_bcrypt(min_rounds) for _ in range(3))
+    extra = math.floor(math.log2(budget_seconds / base)) if base < budget_seconds else 0
+    rounds = max(min_rounds, min(max_rounds, min_rounds + extra))
+    context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+    return HashCalibration(
+        rounds=rounds,
+        hash_seconds=_time_bcrypt(rounds),
+        budget_seconds=budget_seconds,
+    )
+
+
+def _time_bcrypt(rounds: int) -> float:
+    start = time.perf_counter()
+    bcrypt.using(rounds=rounds).hash("calibration")
+    return time.perf_counter() - start
+
+
+T = TypeVar("T")
+
+
+class HashingExecutor:
+    """
+    A few dedicated threads for bcrypt, which releases the GIL while hashing.
+
+    Keeps slow hashes off the event loop and out of the threadpool serving
+    sync routes. When `max_queue` calls are already waiting for a thread, new
+    ones are rejected with a 503 instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, max_queue: int) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hashing"
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.calibration: HashCalibration | None = None
+        self.queue_wait = Histogram()
+        self.duration = Histogram()
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many password checks in progress, try again shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+        submitted = time.perf_counter()
+
+        def call() -> T:
+            started = time.perf_counter()
+            self.queue_wait.observe(started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                self.duration.observe(time.perf_counter() - started)
+
+        try:
+            future = self._executor.submit(call)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the thread is done, not when the caller stops waiting:
+        # a cancelled request leaves its hash running
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def record_rehash(self) -> None:
+        with self._lock:
+            self.rehashed += 1
+
+    def stats(self) -> HashingStats:
+        with self._lock:
+            in_flight = self._in_flight
+        return HashingStats(
+            workers=self.workers,
+            max_queue=self.max_queue,
+            in_flight=in_flight,
+            queued=max(in_flight - self.workers, 0),
+            rejected=self.rejected,
+            rehashed=self.rehashed,
+            calibration=self.calibration,
+            queue_wait=HistogramPublic(**self.queue_wait.snapshot()),
+            duration=HistogramPublic(**self.duration.snapshot()),
+        )
+
+
+hashing_executor = HashingExecutor(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_QUEUE_SIZE,
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hashing_executor.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await hashing_executor.run(get_password_hash, password)
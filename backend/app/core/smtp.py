@@ -0,0 +1,185 @@
+import asyncio
+import smtplib
+import threading
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.message import EmailMessage
+
+from app.core.config import settings
+
+
+def connect_smtp() -> smtplib.SMTP:
+    """Open a connection to the configured server, with TLS and login done."""
+    assert settings.SMTP_HOST, "no provided configuration for email variables"
+    conn: smtplib.SMTP
+    if settings.SMTP_SSL:
+        conn = smtplib.SMTP_SSL(
+            settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT
+        )
+    else:
+        conn = smtplib.SMTP(
+            settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT
+        )
+        if settings.SMTP_TLS:
+            conn.starttls()
+    if settings.SMTP_USER:
+        conn.login(settings.SMTP_USER, settings.SMTP_PASSWORD or "")
+    return conn
+
+
+@dataclass
+class _Connection:
+    smtp: smtplib.SMTP
+    last_used: float
+    messages: int = 0
+
+
+class SMTPPool:
+    """
+    Keeps up to `size` authenticated SMTP connections open between messages,
+    so the TCP and TLS handshakes and the login are paid once per connection
+    instead of once per email.
+
+    A connection is dropped once it sat idle for `max_idle` seconds, since
+    servers close idle clients, or sent `max_messages`, since many servers
+    limit messages per connection. If the server closed a reused connection
+    anyway, the send is retried once on a new one.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], smtplib.SMTP] = connect_smtp,
+        size: int = settings.SMTP_POOL_SIZE,
+        max_idle: float = settings.SMTP_POOL_MAX_IDLE_SECONDS,
+        max_messages: int = settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+    ) -> None:
+        self.connect = connect
+        self.size = size
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self._idle: list[_Connection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections_opened = 0
+
+    def _checkout(self) -> tuple[_Connection, bool]:
+        """A live idle connection, or a new one; True if it was reused."""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                break
+            if now - conn.last_used < self.max_idle:
+                return conn, True
+            self._quit(conn)
+        self.connections_opened += 1
+        return _Connection(self.connect(), now), False
+
+    def _checkin(self, conn: _Connection) -> None:
+        conn.last_used = time.monotonic()
+        if conn.messages >= self.max_messages:
+            self._quit(conn)
+            return
+        with self._lock:
+            self._idle.append(conn)
+
+    @staticmethod
+    def _quit(conn: _Connection) -> None:
+        try:
+            conn.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.smtp.close()
+
+    def _send_on(self, conn: _Connection, message: EmailMessage) -> None:
+        conn.smtp.send_message(message)
+        conn.messages += 1
+
+    def send_many(self, messages: Sequence[EmailMessage]) -> list[Exception | None]:
+        """
+        Send messages in order over one connection, returning None for each
+        one sent and the exception for each one that wasn't. A message the
+        server refused doesn't stop the others.
+        """
+        results: list[Exception | None] = []
+        with self._slots:
+            conn: _Connection | None = None
+            for message in messages:
+                try:
+                    if conn is None or conn.messages >= self.max_messages:
+                        if conn is not None:
+                            self._quit(conn)
+                        conn, reused = self._checkout()
+                    else:
+                        reused = True
+                    try:
+                        self._send_on(conn, message)
+                    except smtplib.SMTPServerDisconnected:
+                        if not reused:
+                            raise
+                        # The server dropped it while idle, retry on a new one
+                        conn.smtp.close()
+                        conn = None
+                        conn, _ = self._checkout()
+                        self._send_on(conn, message)
+                except (
+                    smtplib.SMTPRecipientsRefused,
+                    smtplib.SMTPSenderRefused,
+                    smtplib.SMTPDataError,
+                ) as e:
+                    # Refused by the server, which leaves the connection usable
+                    results.append(e)
+                except Exception as e:
+                    results.append(e)
+                    if conn is not None:
+                        conn.smtp.close()
+                        conn = None
+                else:
+                    results.append(None)
+            if conn is not None:
+                self._checkin(conn)
+        return results
+
+    def send(self, message: EmailMessage) -> None:
+        [error] = self.send_many([message])
+        if error is not None:
+            raise error
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._quit(conn)
+
+
+class AsyncSMTPPool:
+    """
+    `SMTPPool` for async code. smtplib blocks, so the sends run on threads of
+    their own, one per connection, and never on the event loop.
+    """
+
+    def __init__(self, pool: SMTPPool) -> None:
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool.size, thread_name_prefix="smtp"
+        )
+
+    async def send(self, message: EmailMessage) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.pool.send, message)
+
+    async def send_many(
+        self, messages: Sequence[EmailMessage]
+    ) -> list[Exception | None]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.pool.send_many, messages)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+
+smtp_pool = SMTPPool()
+async_smtp_pool = AsyncSMTPPool(smtp_pool)
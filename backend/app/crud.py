@@ -1,48 +1,157 @@
 import uuid
+from collections.abc import Iterable
+from datetime import datetime
 from typing import Any
 
+from sqlalchemy import bindparam
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
+from app.core.cache import cache_auth_user, failed_login_cache
+from app.core.security import (
+    failed_login_key,
+    get_password_hash,
+    get_password_hash_async,
+    hashing_executor,
+    password_needs_rehash,
+    verify_password,
+    verify_password_async,
+)
 from app.models import Subscription, SubscriptionCreate, User, UserCreate, UserUpdate
 
 
-def create_user(*, session: Session, user_create: UserCreate) -> User:
+def create_user(
+    *, session: Session, user_create: UserCreate, commit: bool = True
+) -> User:
+    """
+    With `commit=False` the user is only flushed, for callers that have more
+    to write in the same transaction, like its welcome email.
+    """
     db_obj = User.model_validate(
         user_create, update={"password_hash": get_password_hash(user_create.password)}
     )
     session.add(db_obj)
-    session.commit()
+    if commit:
+        session.commit()
+    else:
+        session.flush()
     session.refresh(db_obj)
     return db_obj
 
 
+async def create_user_async(
+    *, session: AsyncSession, user_create: UserCreate, commit: bool = True
+) -> User:
+    password_hash = await get_password_hash_async(user_create.password)
+    db_obj = User.model_validate(user_create, update={"password_hash": password_hash})
+    session.add(db_obj)
+    if commit:
+        await session.commit()
+    else:
+        await session.flush()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+# Changing any of these revokes the user's existing access tokens
+_TOKEN_REVOKING_FIELDS = ("is_active", "is_admin")
+
+
 def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     user_data = user_in.model_dump(exclude_unset=True)
-    extra_data = {}
+    extra_data: dict[str, Any] = {}
     if "password" in user_data:
         password = user_data["password"]
         password_hash = get_password_hash(password)
         extra_data["password_hash"] = password_hash
+    if "password" in user_data or any(
+        field in user_data and user_data[field] != getattr(db_user, field)
+        for field in _TOKEN_REVOKING_FIELDS
+    ):
+        extra_data["token_version"] = db_user.token_version + 1
+        extra_data["auth_changed_at"] = datetime.utcnow()
     db_user.sqlmodel_update(user_data, update=extra_data)
     session.add(db_user)
     session.commit()
     session.refresh(db_user)
+    cache_auth_user(db_user)
+    return db_user
+
+
+def update_password(*, session: Session, db_user: User, password: str) -> User:
+    """Set a new password and revoke the tokens issued with the old one."""
+    db_user.password_hash = get_password_hash(password)
+    db_user.token_version += 1
+    db_user.auth_changed_at = datetime.utcnow()
+    session.add(db_user)
+    session.commit()
+    session.refresh(db_user)
+    cache_auth_user(db_user)
     return db_user
 
 
+async def update_password_async(
+    *, session: AsyncSession, db_user: User, password: str
+) -> User:
+    db_user.password_hash = await get_password_hash_async(password)
+    db_user.token_version += 1
+    db_user.auth_changed_at = datetime.utcnow()
+    session.add(db_user)
+    await session.commit()
+    await session.refresh(db_user)
+    cache_auth_user(db_user)
+    return db_user
+
+
+# Built once so its cache key is memoized: every call hits SQLAlchemy's
+# compiled cache and sends identical SQL, which psycopg can keep prepared.
+_user_by_email = select(User).where(User.email == bindparam("email"))
+
+
 def get_user_by_email(*, session: Session, email: str) -> User | None:
-    statement = select(User).where(User.email == email)
-    session_user = session.exec(statement).first()
+    session_user = session.exec(_user_by_email, params={"email": email}).first()
     return session_user
 
 
+async def get_user_by_email_async(*, session: AsyncSession, email: str) -> User | None:
+    result = await session.exec(_user_by_email, params={"email": email})
+    return result.first()
+
+
 def authenticate(*, session: Session, email: str, password: str) -> User | None:
     db_user = get_user_by_email(session=session, email=email)
     if not db_user:
         return None
     if not verify_password(password, db_user.password_hash):
         return None
+    if password_needs_rehash(db_user.password_hash):
+        # Only now is the plain password at hand to upgrade the hash
+        db_user.password_hash = get_password_hash(password)
+        session.add(db_user)
+        session.commit()
+        session.refresh(db_user)
+        hashing_executor.record_rehash()
+    return db_user
+
+
+async def authenticate_async(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    db_user = await get_user_by_email_async(session=session, email=email)
+    if not db_user:
+        return None
+    attempt = failed_login_key(email, password, db_user.password_hash)
+    if failed_login_cache.get(attempt):
+        return None
+    if not await verify_password_async(password, db_user.password_hash):
+        failed_login_cache.set(attempt, True)
+        return None
+    if password_needs_rehash(db_user.password_hash):
+        db_user.password_hash = await get_password_hash_async(password)
+        session.add(db_user)
+        await session.commit()
+        await session.refresh(db_user)
+        hashing_executor.record_rehash()
     return db_user
 
 
@@ -52,3 +161,24 @@ def create_subscription(*, session: Session, subscription_in: SubscriptionCreate
     session.commit()
     session.refresh(db_subscription)
     return db_subscription
+
+
+def bulk_create_subscriptions(
+    *, session: Session, subscriptions: Iterable[Subscription]
+) -> int:
+    """
+    Stream subscriptions into the table with a single COPY.
+
+    Runs inside the session's transaction; the caller commits. Rows are
+    written as the iterable produces them, so it can be a lazy generator.
+    """
+    columns = [column.name for column in Subscription.__table__.columns]  # type: ignore[attr-defined]
+    column_list = ", ".join(f'"{name}"' for name in columns)
+    connection = session.connection().connection.driver_connection
+    written = 0
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY subscription ({column_list}) FROM STDIN") as copy:
+            for subscription in subscriptions:
+                copy.write_row([getattr(subscription, name) for name in columns])
+                written += 1
+    return written
@@ -0,0 +1,50 @@
+import argparse
+import logging
+import signal
+import threading
+
+from app.core.config import settings
+from app.core.db import engine, get_engine
+from app.core.due_notices import send_due_notices
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_once() -> None:
+    result = send_due_notices(engine, read_engine=get_engine(read_only=True))
+    logger.info(
+        "Queued due notices for %d subscriptions of %d users in %.1fs",
+        result.subscriptions,
+        result.users,
+        result.seconds,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Email users about their subscriptions coming up for renewal."
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="run once instead of on a schedule"
+    )
+    args = parser.parse_args()
+    if args.once:
+        run_once()
+        return
+
+    # Reruns are harmless, subscriptions already noticed for their billing
+    # date are skipped
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    while not stop.is_set():
+        try:
+            run_once()
+        except Exception:
+            logger.exception("Sending due notices failed")
+        stop.wait(settings.DUE_NOTICE_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
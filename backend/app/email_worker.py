@@ -0,0 +1,28 @@
+import logging
+import signal
+import threading
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.outbox import OutboxWorker
+from app.core.smtp import smtp_pool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    if not settings.emails_enabled:
+        logger.warning("Emails are not configured, nothing to deliver")
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info("Delivering queued emails")
+    worker = OutboxWorker(engine)
+    worker.run(stop)
+    smtp_pool.close()
+    logger.info("Email worker stopped: %s", worker.stats().model_dump_json())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api.deps import PRIMARY_UNTIL_HEADER
 from app.api.main import api_router
+from app.api.routes import jwks
 from app.core.config import settings
+from app.core.db import async_engine
+from app.core.google_auth import close_async_http_client
+from app.core.revocation import start_revocation_refresh
+from app.core.security import calibrate_password_hashing, hashing_executor
+from app.core.smtp import smtp_pool
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,10 +24,29 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    if settings.PASSWORD_HASH_BUDGET_MS > 0:
+        hashing_executor.calibration = await hashing_executor.run(
+            calibrate_password_hashing,
+            settings.PASSWORD_HASH_BUDGET_MS / 1000,
+            settings.PASSWORD_HASH_MIN_ROUNDS,
+            settings.PASSWORD_HASH_MAX_ROUNDS,
+        )
+    revocation_refresh = await start_revocation_refresh()
+    yield
+    revocation_refresh.cancel()
+    await close_async_http_client()
+    smtp_pool.close()
+    # Async connections are bound to the event loop that opened them
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -28,6 +57,8 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[PRIMARY_UNTIL_HEADER],
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.include_router(jwks.router)
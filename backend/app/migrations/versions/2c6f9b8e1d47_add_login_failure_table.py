@@ -0,0 +1,37 @@
+"""Add loginfailure table for throttling logins across workers
+
+Revision ID: 2c6f9b8e1d47
+Revises: e7a1c5d3b920
+Create Date: 2026-10-17 17:26:51.284930
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2c6f9b8e1d47"
+down_revision: str | None = "e7a1c5d3b920"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "loginfailure",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("key", sqlmodel.sql.sqltypes.AutoString(length=320), nullable=False),
+        sa.Column("failed_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_loginfailure_key_failed_at", "loginfailure", ["key", "failed_at"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_loginfailure_key_failed_at", table_name="loginfailure")
+    op.drop_table("loginfailure")
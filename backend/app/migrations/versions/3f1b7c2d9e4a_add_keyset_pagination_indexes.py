@@ -0,0 +1,63 @@
+"""Add keyset pagination indexes
+
+Revision ID: 3f1b7c2d9e4a
+Revises: 557b95f25abb
+Create Date: 2026-10-17 10:12:41.502317
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1b7c2d9e4a"
+down_revision: str | None = "557b95f25abb"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+INDEXES = [
+    (
+        "ix_subscription_user_id_created_at_id",
+        "subscription",
+        ["user_id", "created_at", "id"],
+    ),
+    (
+        "ix_subscription_user_id_next_billing_date_id",
+        "subscription",
+        ["user_id", "next_billing_date", "id"],
+    ),
+    ("ix_subscription_created_at_id", "subscription", ["created_at", "id"]),
+    (
+        "ix_subscription_next_billing_date_id",
+        "subscription",
+        ["next_billing_date", "id"],
+    ),
+    ("ix_user_created_at_id", "user", ["created_at", "id"]),
+]
+
+
+def upgrade() -> None:
+    # Build without locking the tables against writes
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
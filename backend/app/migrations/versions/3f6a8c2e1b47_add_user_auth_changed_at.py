@@ -0,0 +1,38 @@
+"""Add user.auth_changed_at for workers to follow token version changes
+
+Revision ID: 3f6a8c2e1b47
+Revises: 7c4e1a9b3d25
+Create Date: 2026-10-18 10:12:44.218906
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f6a8c2e1b47"
+down_revision: str | None = "7c4e1a9b3d25"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column(
+            "auth_changed_at",
+            sa.DateTime(),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+    )
+    op.create_index(
+        op.f("ix_user_auth_changed_at"), "user", ["auth_changed_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_user_auth_changed_at"), table_name="user")
+    op.drop_column("user", "auth_changed_at")
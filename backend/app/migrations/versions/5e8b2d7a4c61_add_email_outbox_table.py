@@ -0,0 +1,51 @@
+"""Add emailoutbox table for background email delivery
+
+Revision ID: 5e8b2d7a4c61
+Revises: 9a3d6e2f5c18
+Create Date: 2026-10-17 20:41:09.517263
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5e8b2d7a4c61"
+down_revision: str | None = "9a3d6e2f5c18"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "emailoutbox",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "email_to", sqlmodel.sql.sqltypes.AutoString(length=320), nullable=False
+        ),
+        sa.Column("subject", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("html_content", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column(
+            "status", sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_emailoutbox_pending_next_attempt_at",
+        "emailoutbox",
+        ["next_attempt_at"],
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_emailoutbox_pending_next_attempt_at", table_name="emailoutbox")
+    op.drop_table("emailoutbox")
@@ -0,0 +1,28 @@
+"""Add subscription.due_notice_sent_for for idempotent due notices
+
+Revision ID: 7c4e1a9b3d25
+Revises: 5e8b2d7a4c61
+Create Date: 2026-10-17 21:58:37.104592
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c4e1a9b3d25"
+down_revision: str | None = "5e8b2d7a4c61"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "subscription", sa.Column("due_notice_sent_for", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("subscription", "due_notice_sent_for")
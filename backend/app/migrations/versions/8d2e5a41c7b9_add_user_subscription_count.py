@@ -0,0 +1,92 @@
+"""Add user.subscription_count maintained by triggers
+
+Revision ID: 8d2e5a41c7b9
+Revises: 3f1b7c2d9e4a
+Create Date: 2026-10-17 11:03:27.118640
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2e5a41c7b9"
+down_revision: str | None = "3f1b7c2d9e4a"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column(
+            "subscription_count", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+
+    # Statement level triggers with transition tables, so bulk inserts and
+    # deletes touch each user row once instead of once per subscription.
+    op.execute("""
+        CREATE FUNCTION subscription_count_insert() RETURNS trigger AS $$
+        BEGIN
+            UPDATE "user" u SET subscription_count = u.subscription_count + n.total
+            FROM (SELECT user_id, count(*) AS total FROM new_rows GROUP BY user_id) n
+            WHERE u.id = n.user_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE FUNCTION subscription_count_delete() RETURNS trigger AS $$
+        BEGIN
+            UPDATE "user" u SET subscription_count = u.subscription_count - o.total
+            FROM (SELECT user_id, count(*) AS total FROM old_rows GROUP BY user_id) o
+            WHERE u.id = o.user_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE FUNCTION subscription_count_move() RETURNS trigger AS $$
+        BEGIN
+            UPDATE "user" SET subscription_count = subscription_count - 1 WHERE id = OLD.user_id;
+            UPDATE "user" SET subscription_count = subscription_count + 1 WHERE id = NEW.user_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER subscription_count_insert AFTER INSERT ON subscription
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION subscription_count_insert()
+    """)
+    op.execute("""
+        CREATE TRIGGER subscription_count_delete AFTER DELETE ON subscription
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION subscription_count_delete()
+    """)
+    op.execute("""
+        CREATE TRIGGER subscription_count_move AFTER UPDATE OF user_id ON subscription
+        FOR EACH ROW WHEN (OLD.user_id IS DISTINCT FROM NEW.user_id)
+        EXECUTE FUNCTION subscription_count_move()
+    """)
+
+    # CREATE TRIGGER holds a lock that blocks writes to subscription until
+    # this migration commits, so the backfill can't race concurrent inserts.
+    op.execute("""
+        UPDATE "user" u SET subscription_count = (
+            SELECT count(*) FROM subscription s WHERE s.user_id = u.id
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS subscription_count_move ON subscription")
+    op.execute("DROP TRIGGER IF EXISTS subscription_count_delete ON subscription")
+    op.execute("DROP TRIGGER IF EXISTS subscription_count_insert ON subscription")
+    op.execute("DROP FUNCTION IF EXISTS subscription_count_move()")
+    op.execute("DROP FUNCTION IF EXISTS subscription_count_delete()")
+    op.execute("DROP FUNCTION IF EXISTS subscription_count_insert()")
+    op.drop_column("user", "subscription_count")
@@ -0,0 +1,35 @@
+"""Add deleteduser table so workers forget deleted users
+
+Revision ID: 8d2f4b6a9c13
+Revises: 3f6a8c2e1b47
+Create Date: 2026-10-18 14:06:51.730214
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2f4b6a9c13"
+down_revision: str | None = "3f6a8c2e1b47"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "deleteduser",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_deleteduser_deleted_at"), "deleteduser", ["deleted_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_deleteduser_deleted_at"), table_name="deleteduser")
+    op.drop_table("deleteduser")
@@ -0,0 +1,35 @@
+"""Add user_sessions.revoked_at for signing out devices
+
+Revision ID: 9a3d6e2f5c18
+Revises: 2c6f9b8e1d47
+Create Date: 2026-10-17 18:40:12.661204
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a3d6e2f5c18"
+down_revision: str | None = "2c6f9b8e1d47"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user_sessions", sa.Column("revoked_at", sa.DateTime(), nullable=True)
+    )
+    op.create_index(
+        "ix_user_sessions_revoked_at",
+        "user_sessions",
+        ["revoked_at"],
+        postgresql_where=sa.text("revoked_at IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_sessions_revoked_at", table_name="user_sessions")
+    op.drop_column("user_sessions", "revoked_at")
@@ -0,0 +1,68 @@
+"""Add foreign key and due date indexes
+
+Revision ID: b4c9e07f3a12
+Revises: 8d2e5a41c7b9
+Create Date: 2026-10-17 11:41:09.634025
+
+subscription.user_id is already covered by the (user_id, created_at, id)
+index from 3f1b7c2d9e4a. payments has no model yet, so its index is only
+created here.
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b4c9e07f3a12"
+down_revision: str | None = "8d2e5a41c7b9"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+INDEXES = [
+    ("ix_user_sessions_user_id", "user_sessions", ["user_id"], None),
+    ("ix_user_preferences_user_id", "user_preferences", ["user_id"], None),
+    (
+        "ix_notification_user_id_created_at",
+        "notification",
+        ["user_id", "created_at"],
+        None,
+    ),
+    ("ix_auditlog_user_id_timestamp", "auditlog", ["user_id", "timestamp"], None),
+    ("ix_payments_user_id", "payments", ["user_id"], None),
+    (
+        "ix_subscription_active_next_billing_date",
+        "subscription",
+        ["next_billing_date", "user_id"],
+        "active",
+    ),
+]
+
+
+def upgrade() -> None:
+    # Build without locking the tables against writes
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
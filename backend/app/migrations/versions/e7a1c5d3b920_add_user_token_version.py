@@ -0,0 +1,29 @@
+"""Add user.token_version for revoking access tokens
+
+Revision ID: e7a1c5d3b920
+Revises: b4c9e07f3a12
+Create Date: 2026-10-17 15:42:08.503117
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e7a1c5d3b920"
+down_revision: str | None = "b4c9e07f3a12"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("user", "token_version")
@@ -1,5 +1,6 @@
 import uuid
 from pydantic import EmailStr
+from sqlalchemy import Index, text
 from sqlmodel import Field, Relationship, SQLModel, Column, JSON
 from typing import Optional, List
 from datetime import datetime
@@ -96,8 +97,20 @@ class User(UserBase):
     class Config:
         table = True
         from_attributes = True
+    __table_args__ = (
+        # Keyset pagination of the admin user listing
+        Index("ix_user_created_at_id", "created_at", "id"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     password_hash: str
+    # Maintained by triggers on the subscription table, never set by the app
+    subscription_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Carried in access tokens; bumping it revokes all tokens issued before
+    token_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Set with every token_version bump, workers follow it to stay current
+    auth_changed_at: datetime = Field(
+        default_factory=datetime.utcnow, nullable=False, index=True
+    )
     preferences: Optional["UserPreferences"] = Relationship(
         back_populates="user",
         sa_relationship_kwargs={"uselist": False}
@@ -122,7 +135,10 @@ class UserPublic(UserBase):
 # Public properties for Users
 class UsersPublic(SQLModel):
     data: List[UserPublic]
-    count: int
+    # None when requested with count_mode=none
+    count: Optional[int]
+    # Pass back as `cursor` to get the next page, None on the last page
+    next_cursor: Optional[str] = None
 
 
 # ------------------------------- Plan Models -------------------------------
@@ -194,17 +210,72 @@ class SubscriptionUpdate(SQLModel):
 class Subscription(SubscriptionBase):
     class Config:
         table = True
+    # Keyset pagination, per user and for the admin listing, in both sort orders.
+    # The (user_id, ...) indexes also serve plain lookups by user_id.
+    __table_args__ = (
+        Index("ix_subscription_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index(
+            "ix_subscription_user_id_next_billing_date_id",
+            "user_id",
+            "next_billing_date",
+            "id",
+        ),
+        Index("ix_subscription_created_at_id", "created_at", "id"),
+        Index("ix_subscription_next_billing_date_id", "next_billing_date", "id"),
+        # Active subscriptions coming up for renewal
+        Index(
+            "ix_subscription_active_next_billing_date",
+            "next_billing_date",
+            "user_id",
+            postgresql_where=text("active"),
+        ),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
     user: Optional["User"] = Relationship(back_populates="subscriptions")
+    # The billing date a due notice was last sent for; a renewal moves
+    # next_billing_date on and makes the subscription due for a new one
+    due_notice_sent_for: Optional[datetime] = None
 
 class SubscriptionPublic(SubscriptionBase):
     id: uuid.UUID
     user_id: uuid.UUID
 
+# Fields that can be applied to many subscriptions at once
+class SubscriptionBulkPatch(SQLModel):
+    name: str | None = Field(default=None, min_length=1, max_length=100)
+    description: Optional[str] | None = Field(default=None, max_length=255)
+    amount: float | None = Field(default=None, ge=0)
+    next_billing_date: datetime | None = None
+    active: bool | None = None
+    auto_renew: bool | None = None
+
+class SubscriptionBulkUpdate(SQLModel):
+    ids: List[uuid.UUID] = Field(min_length=1, max_length=1000)
+    patch: SubscriptionBulkPatch
+
+class SubscriptionBulkDelete(SQLModel):
+    ids: List[uuid.UUID] = Field(min_length=1, max_length=1000)
+
+class SubscriptionsDeleted(SQLModel):
+    ids: List[uuid.UUID]
+    count: int
+
+class SubscriptionImportError(SQLModel):
+    # 1-based position of the row in the uploaded file or array
+    row: int
+    errors: List[str]
+
+class SubscriptionImportResult(SQLModel):
+    imported: int
+    errors: List[SubscriptionImportError]
+
 class SubscriptionsPublic(SQLModel):
     data: List[SubscriptionPublic]
-    count: int
+    # None when requested with count_mode=none
+    count: Optional[int]
+    # Pass back as `cursor` to get the next page, None on the last page
+    next_cursor: Optional[str] = None
 
 
 # ------------------------------- User Preferences Models -------------------------------
@@ -214,7 +285,7 @@ class UserPreferences(SQLModel):
     class Config:
         table = True
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    user_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
+    user_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE", index=True)
     user: User = Relationship(back_populates="preferences")
     email_notifications: bool = Field(default=False)
     push_notifications: bool = Field(default=False)
@@ -278,6 +349,9 @@ class UserPreferencesUpdate(SQLModel):
 class Notification(SQLModel):
     class Config:
         table = True
+    __table_args__ = (
+        Index("ix_notification_user_id_created_at", "user_id", "created_at"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
     user: User = Relationship(back_populates="notifications")
@@ -313,6 +387,9 @@ class Discount(SQLModel):
 class AuditLog(SQLModel):
     class Config:
         table = True
+    __table_args__ = (
+        Index("ix_auditlog_user_id_timestamp", "user_id", "timestamp"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
     user: User = Relationship(back_populates="audit_logs")
@@ -320,6 +397,49 @@ class AuditLog(SQLModel):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
+# ------------------------------- Login Throttling Models -------------------------------
+
+# One failed login attempt, per throttling key (email or client IP). Only
+# used when the workers share their counts through the database.
+class LoginFailure(SQLModel):
+    class Config:
+        table = True
+    __table_args__ = (
+        Index("ix_loginfailure_key_failed_at", "key", "failed_at"),
+    )
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    key: str = Field(max_length=320)
+    failed_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ------------------------------- Email Outbox Models -------------------------------
+
+# An email waiting to be sent, then its delivery record. Added in the same
+# transaction as the change it's about, delivered by app.email_worker.
+class EmailOutbox(SQLModel):
+    class Config:
+        table = True
+    __table_args__ = (
+        # What the workers claim from: due pending emails, oldest first
+        Index(
+            "ix_emailoutbox_pending_next_attempt_at",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    email_to: str = Field(max_length=320)
+    subject: str
+    html_content: str
+    # "pending" until sent, "failed" once out of attempts
+    status: str = Field(default="pending", max_length=16)
+    attempts: int = Field(default=0)
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = None
+
+
 # ------------------------------- Token Models -------------------------------
 
 class Token(SQLModel):
@@ -330,6 +450,24 @@ class Token(SQLModel):
 
 class TokenPayload(SQLModel):
     sub: Optional[str] = None
+    # Authorization claims, absent from tokens issued before they were added
+    ver: Optional[int] = None
+    # UserSession the token was issued for
+    sid: Optional[uuid.UUID] = None
+    email: Optional[str] = None
+    is_active: Optional[bool] = None
+    is_verified: Optional[bool] = None
+    is_admin: Optional[bool] = None
+
+
+# The fields of User that authentication needs, small enough to cache
+class AuthUser(SQLModel):
+    id: uuid.UUID
+    email: str
+    is_active: bool
+    is_verified: bool
+    is_admin: bool
+    token_version: int = 0
 
 
 # ------------------------------- Password Reset Models -------------------------------
@@ -350,8 +488,16 @@ class UserSession(SQLModel):
     __tablename__ = "user_sessions"
     class Config:
         table = True
+    __table_args__ = (
+        # Revocations are followed by every worker, see app.core.revocation
+        Index(
+            "ix_user_sessions_revoked_at",
+            "revoked_at",
+            postgresql_where=text("revoked_at IS NOT NULL"),
+        ),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    user_id: uuid.UUID = Field(foreign_key="user.id")
+    user_id: uuid.UUID = Field(foreign_key="user.id", index=True)
     device_name: str
     device_type: str
     device_ip: Optional[str] = None
@@ -359,9 +505,20 @@ class UserSession(SQLModel):
     is_current: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_active: datetime = Field(default_factory=datetime.utcnow)
+    # Set when the session is signed out; its tokens stop working
+    revoked_at: Optional[datetime] = None
 
     user: User = Relationship(back_populates="sessions")
 
+
+# The id of a deleted user, kept for a day so that every worker drops the
+# user from its auth states, see app.core.revocation
+class DeletedUser(SQLModel):
+    class Config:
+        table = True
+    id: uuid.UUID = Field(primary_key=True)
+    deleted_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
 class UserSessionsReadResponse(SQLModel):
     sessions: List[UserSession]
 
@@ -397,3 +554,96 @@ class UserSessionsCreateResponse(SQLModel):
 
 class UserSessionsUpdateCurrentResponse(SQLModel):
     message: str
+
+
+# ------------------------------- Metrics Models -------------------------------
+
+class HistogramPublic(SQLModel):
+    # Cumulative counts keyed by bucket upper bound, "+Inf" included
+    buckets: dict[str, int]
+    count: int
+    sum: float
+
+
+class PoolStatus(SQLModel):
+    name: str
+    size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    max_overflow: int
+    timeouts: int
+    wait_time: HistogramPublic
+
+
+class PoolStatusPublic(SQLModel):
+    worker_pid: int
+    pools: List[PoolStatus]
+
+
+class HashCalibration(SQLModel):
+    rounds: int
+    # Measured time of one hash at `rounds` when the worker started
+    hash_seconds: float
+    budget_seconds: float
+
+
+class HashingStats(SQLModel):
+    workers: int
+    max_queue: int
+    in_flight: int
+    queued: int
+    rejected: int
+    # Hashes upgraded to the current cost on login
+    rehashed: int
+    # None when calibration is disabled and passlib's default cost is used
+    calibration: Optional[HashCalibration]
+    queue_wait: HistogramPublic
+    duration: HistogramPublic
+
+
+class HashingStatsPublic(SQLModel):
+    worker_pid: int
+    hashing: HashingStats
+
+
+class CacheStats(SQLModel):
+    name: str
+    size: int
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
+
+
+class CacheStatsPublic(SQLModel):
+    worker_pid: int
+    caches: List[CacheStats]
+
+
+class EmailOutboxStats(SQLModel):
+    pending: int
+    # Pending emails whose earlier attempts failed
+    retrying: int
+    sent: int
+    failed: int
+    # How long the oldest pending email has been queued, 0 when none is
+    oldest_pending_seconds: float
+
+
+class DueNoticeRun(SQLModel):
+    # Users emailed, and the subscriptions their emails were about
+    users: int
+    subscriptions: int
+    seconds: float
+
+
+class EmailWorkerStats(SQLModel):
+    sent: int
+    retried: int
+    failed: int
+    # Time of one SMTP delivery, and from enqueueing to delivery
+    send_duration: HistogramPublic
+    delivery_lag: HistogramPublic
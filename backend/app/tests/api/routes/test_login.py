@@ -1,11 +1,20 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
+from urllib.parse import parse_qs
 
+import httpx
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, select
 
+from app.api.routes import auth
+from app.core import google_auth
 from app.core.config import settings
 from app.core.security import verify_password
 from app.models import User
+from app.tests.utils.utils import random_email, random_lower_string
 from app.utils import generate_password_reset_token
 
 
@@ -102,3 +111,55 @@ def test_reset_password_invalid_token(
     assert "detail" in response
     assert r.status_code == 400
     assert response["detail"] == "Invalid token"
+
+
+def test_failed_logins_are_throttled(client: TestClient) -> None:
+    login_data = {"username": random_email(), "password": "wrong-password"}
+    for _ in range(settings.LOGIN_MAX_FAILURES_PER_EMAIL):
+        r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+        assert r.status_code == 400
+    r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+    assert r.status_code == 429
+    assert "Retry-After" in r.headers
+
+
+def test_google_callbacks_do_not_block_each_other(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    delay = 0.3
+
+    async def token_endpoint(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        code = parse_qs(request.content.decode())["code"][0]
+        return httpx.Response(200, json={"id_token": code})
+
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", "client-id")
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_SECRET", "client-secret")
+    monkeypatch.setattr(settings, "GOOGLE_REDIRECT_URI", "http://localhost/cb")
+    monkeypatch.setattr(
+        google_auth,
+        "_async_http_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(token_endpoint)),
+    )
+    monkeypatch.setattr(
+        auth,
+        "verify_google_token",
+        lambda id_token: {"email": f"{id_token}@example.com", "sub": id_token},
+    )
+
+    def callback(code: str) -> int:
+        r = client.get(
+            f"{settings.API_V1_STR}/auth/google/callback",
+            params={"code": code},
+            follow_redirects=False,
+        )
+        return r.status_code
+
+    codes = [random_lower_string() for _ in range(5)]
+    start = time.monotonic()
+    with ThreadPoolExecutor(len(codes)) as pool:
+        statuses = list(pool.map(callback, codes))
+    elapsed = time.monotonic() - start
+
+    assert statuses == [307] * len(codes)
+    assert elapsed < delay * len(codes)
@@ -1,10 +1,16 @@
+import csv
+import io
+import json
 import uuid
 
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from app.api.routes import subscriptions as subscriptions_routes
 from app.core.config import settings
-from backend.app.tests.utils.subscription import create_random_subscription
+from app.tests.utils.subscription import create_random_subscription
+from app.tests.utils.utils import random_lower_string
 
 
 def test_create_item(
@@ -162,3 +168,204 @@ def test_delete_item_not_enough_permissions(
     assert response.status_code == 400
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+def test_read_subscriptions_count_modes(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    for _ in range(2):
+        data = {
+            "user_id": str(uuid.uuid4()),
+            "name": random_lower_string()[:20],
+            "next_billing_date": "2030-01-01T00:00:00",
+        }
+        r = client.post(
+            f"{settings.API_V1_STR}/subscriptions/",
+            headers=normal_user_token_headers,
+            json=data,
+        )
+        assert r.status_code == 200
+
+    r = client.get(
+        f"{settings.API_V1_STR}/subscriptions/",
+        headers=normal_user_token_headers,
+        params={"count_mode": "exact", "limit": 1000},
+    )
+    content = r.json()
+    # The per-user counter matches the rows actually listed
+    assert content["count"] == len(content["data"]) >= 2
+
+    r = client.get(
+        f"{settings.API_V1_STR}/subscriptions/",
+        headers=normal_user_token_headers,
+        params={"count_mode": "none"},
+    )
+    assert r.json()["count"] is None
+
+
+def test_import_subscriptions_json(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    rows = [
+        {"name": "Music", "amount": 9.99, "next_billing_date": "2030-01-01T00:00:00"},
+        {"name": "", "amount": -1},
+        {"name": "Video", "next_billing_date": "2030-02-01T00:00:00"},
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/subscriptions/import",
+        headers=normal_user_token_headers,
+        json=rows,
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["imported"] == 2
+    assert [error["row"] for error in content["errors"]] == [2]
+
+
+
+def test_import_subscriptions_json_in_batches(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(subscriptions_routes, "IMPORT_BATCH_SIZE", 2)
+    rows: list[object] = [{"name": f"Service {i}", "amount": i} for i in range(5)]
+    rows[3] = "not an object"
+    r = client.post(
+        f"{settings.API_V1_STR}/subscriptions/import",
+        headers={**normal_user_token_headers, "Content-Type": "application/json"},
+        content=(chunk.encode() for chunk in json.dumps(rows)),
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["imported"] == 4
+    assert [error["row"] for error in content["errors"]] == [4]
+
+
+def test_import_subscriptions_json_rejects_bad_bodies(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    url = f"{settings.API_V1_STR}/subscriptions/import"
+    headers = {**normal_user_token_headers, "Content-Type": "application/json"}
+    r = client.post(url, headers=headers, content=b'[{"name": "Music"},')
+    assert r.status_code == 422
+
+    monkeypatch.setattr(settings, "SUBSCRIPTION_IMPORT_MAX_BYTES", 64)
+    body = json.dumps([{"name": random_lower_string()} for _ in range(5)])
+    r = client.post(url, headers=headers, content=body)
+    assert r.status_code == 413
+    r = client.post(url, headers=headers, content=(c.encode() for c in body))
+    assert r.status_code == 413
+
+def test_import_subscriptions_csv(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    csv_content = (
+        "name,amount,currency,next_billing_date\n"
+        "Music,9.99,USD,2030-01-01T00:00:00\n"
+        "Video,,,not-a-date\n"
+    )
+    r = client.post(
+        f"{settings.API_V1_STR}/subscriptions/import/csv",
+        headers=normal_user_token_headers,
+        files={"file": ("subscriptions.csv", csv_content, "text/csv")},
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["imported"] == 1
+    assert content["errors"][0]["row"] == 2
+
+
+def test_bulk_update_and_delete_subscriptions(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    ids = []
+    for _ in range(2):
+        data = {
+            "user_id": str(uuid.uuid4()),
+            "name": random_lower_string()[:20],
+            "next_billing_date": "2030-01-01T00:00:00",
+        }
+        r = client.post(
+            f"{settings.API_V1_STR}/subscriptions/",
+            headers=normal_user_token_headers,
+            json=data,
+        )
+        ids.append(r.json()["id"])
+    unknown_id = str(uuid.uuid4())
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/subscriptions/bulk",
+        headers=normal_user_token_headers,
+        json={"ids": [*ids, unknown_id], "patch": {"active": False}},
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["count"] == 2
+    assert {s["id"] for s in content["data"]} == set(ids)
+    assert all(s["active"] is False for s in content["data"])
+
+    for patch in ({"name": None}, {"amount": None}, {"next_billing_date": None}):
+        r = client.patch(
+            f"{settings.API_V1_STR}/subscriptions/bulk",
+            headers=normal_user_token_headers,
+            json={"ids": ids, "patch": patch},
+        )
+        assert r.status_code == 422
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/subscriptions/bulk",
+        headers=normal_user_token_headers,
+        json={"ids": ids, "patch": {"description": None}},
+    )
+    assert r.status_code == 200
+    assert all(s["description"] is None for s in r.json()["data"])
+
+    r = client.post(
+        f"{settings.API_V1_STR}/subscriptions/bulk-delete",
+        headers=normal_user_token_headers,
+        json={"ids": [*ids, unknown_id]},
+    )
+    assert r.status_code == 200
+    assert set(r.json()["ids"]) == set(ids)
+
+
+def test_export_subscriptions(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    name = random_lower_string()
+    data = {
+        "user_id": str(uuid.uuid4()),
+        "name": name,
+        "amount": 4.5,
+        "next_billing_date": "2031-03-01T00:00:00",
+    }
+    r = client.post(
+        f"{settings.API_V1_STR}/subscriptions/",
+        headers=normal_user_token_headers,
+        json=data,
+    )
+    assert r.status_code == 200
+
+    params = {"billing_from": "2031-03-01T00:00:00", "billing_to": "2031-03-02T00:00:00"}
+    r = client.get(
+        f"{settings.API_V1_STR}/subscriptions/export",
+        headers=normal_user_token_headers,
+        params=params,
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert name in [row["name"] for row in rows]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/subscriptions/export",
+        headers=normal_user_token_headers,
+        params={**params, "format": "csv"},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    reader = csv.DictReader(io.StringIO(r.text))
+    assert name in [row["name"] for row in reader]
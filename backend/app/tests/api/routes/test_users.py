@@ -1,4 +1,5 @@
 import uuid
+from datetime import timedelta
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
@@ -6,9 +7,15 @@ from sqlmodel import Session, select
 
 from app import crud
 from app.core.config import settings
-from app.core.security import verify_password
+from app.core.revocation import AuthState, user_auth_states
+from app.core.security import create_access_token, user_claims, verify_password
 from app.models import User, UserCreate
-from app.tests.utils.utils import random_email, random_lower_string
+from app.tests.utils.user import user_authentication_headers
+from app.tests.utils.utils import (
+    get_superuser_token_headers,
+    random_email,
+    random_lower_string,
+)
 
 
 def test_get_users_superuser_me(
@@ -168,6 +175,47 @@ def test_retrieve_users(
         assert "email" in item
 
 
+def test_retrieve_users_cursor_pagination(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(3):
+        user_in = UserCreate(email=random_email(), password=random_lower_string())
+        crud.create_user(session=db, user_create=user_in)
+
+    seen: list[str] = []
+    cursor = None
+    while True:
+        params: dict[str, str | int] = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get(
+            f"{settings.API_V1_STR}/users/",
+            headers=superuser_token_headers,
+            params=params,
+        )
+        assert r.status_code == 200
+        page = r.json()
+        seen.extend(user["id"] for user in page["data"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert len(seen) == page["count"]
+
+
+def test_retrieve_users_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"cursor": "not-a-cursor"},
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
+
+
 def test_update_user_me(
     client: TestClient, normal_user_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -214,6 +262,13 @@ def test_update_password_me(
     assert user_db.email == settings.FIRST_SUPERUSER
     assert verify_password(new_password, user_db.hashed_password)
 
+    # Changing the password revokes the tokens issued before
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=superuser_token_headers)
+    assert r.status_code == 403
+    login_data = {"username": settings.FIRST_SUPERUSER, "password": new_password}
+    r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+    new_headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
     # Revert to the old password to keep consistency in test
     old_data = {
         "current_password": new_password,
@@ -221,13 +276,15 @@ def test_update_password_me(
     }
     r = client.patch(
         f"{settings.API_V1_STR}/users/me/password",
-        headers=superuser_token_headers,
+        headers=new_headers,
         json=old_data,
     )
     db.refresh(user_db)
 
     assert r.status_code == 200
     assert verify_password(settings.FIRST_SUPERUSER_PASSWORD, user_db.hashed_password)
+    # The module's other tests keep using the shared headers
+    superuser_token_headers.update(get_superuser_token_headers(client))
 
 
 def test_update_password_me_incorrect_password(
@@ -413,6 +470,29 @@ def test_delete_user_me(client: TestClient, db: Session) -> None:
     assert user_db is None
 
 
+def test_deleted_user_token_stops_working(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    token = create_access_token(
+        user.id, expires_delta=timedelta(minutes=5), claims=user_claims(user)
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    user_auth_states.set(user.id, AuthState(user.token_version, True, False))
+    # Authorized from the claims
+    r = client.get(f"{settings.API_V1_STR}/subscriptions/export", headers=headers)
+    assert r.status_code == 200
+
+    r = client.delete(
+        f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    assert user_auth_states.get(user.id) is None
+    r = client.get(f"{settings.API_V1_STR}/subscriptions/export", headers=headers)
+    assert r.status_code == 404
+
+
 def test_delete_user_me_as_superuser(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -484,3 +564,32 @@ def test_delete_user_without_privileges(
     )
     assert r.status_code == 403
     assert r.json()["detail"] == "The user doesn't have enough privileges"
+
+
+def test_revoke_user_sessions(client: TestClient, db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password, is_verified=True)
+    crud.create_user(session=db, user_create=user_in)
+    first = user_authentication_headers(client=client, email=email, password=password)
+    second = user_authentication_headers(client=client, email=email, password=password)
+
+    r = client.get(f"{settings.API_V1_STR}/users/user-sessions", headers=first)
+    assert r.status_code == 200
+    assert len(r.json()["sessions"]) == 2
+
+    r = client.post(
+        f"{settings.API_V1_STR}/users/user-sessions/revoke-others", headers=first
+    )
+    assert r.status_code == 200
+    # Only the other device is signed out
+    assert client.get(f"{settings.API_V1_STR}/users/me", headers=second).status_code == 403
+    assert client.get(f"{settings.API_V1_STR}/users/me", headers=first).status_code == 200
+
+    r = client.get(f"{settings.API_V1_STR}/users/user-sessions", headers=first)
+    (current,) = r.json()["sessions"]
+    r = client.delete(
+        f"{settings.API_V1_STR}/users/user-sessions/{current['id']}", headers=first
+    )
+    assert r.status_code == 200
+    assert client.get(f"{settings.API_V1_STR}/users/me", headers=first).status_code == 403
@@ -0,0 +1,205 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any
+
+import jwt
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import deps
+from app.core.cache import auth_user_cache, token_cache
+from app.core.revocation import AuthState, revoked_sessions, user_auth_states
+from app.core.security import create_access_token, user_claims
+from app.models import AuthUser
+
+replica_app = FastAPI()
+
+
+@replica_app.get("/read")
+def read(read_only: deps.ReplicaDep) -> Any:
+    return read_only
+
+
+@replica_app.get("/identity")
+def identity(current_user: deps.CurrentIdentity) -> Any:
+    return current_user.email
+
+
+@replica_app.get("/claims")
+def claims(current_user: deps.CurrentClaims) -> Any:
+    return current_user.is_admin
+
+
+@replica_app.post("/write")
+def write(read_only: deps.ReplicaDep) -> Any:
+    return read_only
+
+
+def test_reads_go_to_replica_until_a_write(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(deps, "replica_engines", [object()])
+    with TestClient(replica_app) as c:
+        assert c.get("/read").json() is True
+        r = c.post("/write")
+        assert r.json() is False
+        assert deps.PRIMARY_STICKY_COOKIE in r.cookies
+        # read-your-writes: the sticky cookie pins reads to the primary
+        assert c.get("/read").json() is False
+
+
+def test_bearer_clients_read_their_writes_without_cookies(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(deps, "replica_engines", [object()])
+    token = create_access_token(uuid.uuid4(), expires_delta=timedelta(minutes=5))
+    headers = {"Authorization": f"Bearer {token}"}
+    with TestClient(replica_app) as c:
+        r = c.post("/write", headers=headers)
+        primary_until = r.headers[deps.PRIMARY_UNTIL_HEADER]
+        # Cross-origin clients don't send the cookie back
+        c.cookies.clear()
+        # The user just wrote through this worker
+        assert c.get("/read", headers=headers).json() is False
+        # Or the client echoes the header, whichever worker it reaches
+        assert c.get("/read").json() is True
+        r = c.get("/read", headers={deps.PRIMARY_UNTIL_HEADER: primary_until})
+        assert r.json() is False
+
+
+def test_no_replicas_configured(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(deps, "replica_engines", [])
+    with TestClient(replica_app) as c:
+        assert c.get("/read").json() is False
+        r = c.post("/write")
+        assert deps.PRIMARY_STICKY_COOKIE not in r.cookies
+
+
+def test_identity_served_from_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(deps, "replica_engines", [])
+    user_id = uuid.uuid4()
+    token = create_access_token(user_id, expires_delta=timedelta(minutes=5))
+    headers = {"Authorization": f"Bearer {token}"}
+    auth_user_cache.set(
+        str(user_id),
+        AuthUser(
+            id=user_id,
+            email="cached@example.com",
+            is_active=True,
+            is_verified=True,
+            is_admin=False,
+        ),
+    )
+    hits = auth_user_cache.hits
+    try:
+        with TestClient(replica_app) as c:
+            # The user only exists in the cache, so a DB lookup would 404
+            r = c.get("/identity", headers=headers)
+            assert r.json() == "cached@example.com"
+        assert auth_user_cache.hits == hits + 1
+    finally:
+        auth_user_cache.pop(str(user_id))
+
+
+def test_claims_authorize_without_lookup(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(deps, "replica_engines", [])
+    user = AuthUser(
+        id=uuid.uuid4(),
+        email="claims@example.com",
+        is_active=True,
+        is_verified=True,
+        is_admin=True,
+        token_version=3,
+    )
+    token = create_access_token(
+        user.id, expires_delta=timedelta(minutes=5), claims=user_claims(user)
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    lookups: list[Any] = []
+
+    async def load_identity(_engine: Any, token_data: Any) -> AuthUser:
+        lookups.append(token_data.sub)
+        return user
+
+    monkeypatch.setattr(deps, "_load_identity", load_identity)
+    try:
+        with TestClient(replica_app) as c:
+            # Not known to this worker yet, the claims alone aren't trusted
+            assert c.get("/claims", headers=headers).json() is True
+            assert lookups == [str(user.id)]
+
+            user_auth_states.set(user.id, AuthState(3, True, True))
+            assert c.get("/claims", headers=headers).json() is True
+            assert len(lookups) == 1
+
+            # A version bump picked up from another worker revokes the token
+            user_auth_states.set(user.id, AuthState(4, True, False))
+            r = c.get("/claims", headers=headers)
+            assert r.status_code == 403
+
+            # And so does a newer version cached by this worker
+            user_auth_states.set(user.id, AuthState(3, True, True))
+            auth_user_cache.set(
+                str(user.id), user.model_copy(update={"token_version": 4})
+            )
+            r = c.get("/claims", headers=headers)
+            assert r.status_code == 403
+    finally:
+        auth_user_cache.pop(str(user.id))
+        user_auth_states._states.pop(user.id, None)
+
+
+def test_revoked_session_tokens_are_rejected(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(deps, "replica_engines", [])
+    user = AuthUser(
+        id=uuid.uuid4(),
+        email="revoked@example.com",
+        is_active=True,
+        is_verified=True,
+        is_admin=False,
+    )
+    session_id = uuid.uuid4()
+    token = create_access_token(
+        user.id,
+        expires_delta=timedelta(minutes=5),
+        claims={**user_claims(user), "sid": str(session_id)},
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    user_auth_states.set(user.id, AuthState(0, True, False))
+    try:
+        with TestClient(replica_app) as c:
+            assert c.get("/claims", headers=headers).status_code == 200
+            # The token is cached now, that must not skip the revocation check
+            revoked_sessions.add(session_id, datetime.utcnow())
+            r = c.get("/claims", headers=headers)
+            assert r.status_code == 403
+            assert r.json()["detail"] == "Session has been revoked"
+    finally:
+        user_auth_states._states.pop(user.id, None)
+
+
+def test_decoded_tokens_cached_until_expiry(monkeypatch: pytest.MonkeyPatch) -> None:
+    decodes = 0
+    real_decode = jwt.decode
+
+    def counting_decode(*args: Any, **kwargs: Any) -> Any:
+        nonlocal decodes
+        decodes += 1
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(jwt, "decode", counting_decode)
+    token = create_access_token(uuid.uuid4(), expires_delta=timedelta(seconds=60))
+    hits = token_cache.hits
+
+    first = deps.decode_token(token)
+    assert deps.decode_token(token) == first
+    assert decodes == 1
+    assert token_cache.hits == hits + 1
+    assert token_cache.stats().hit_rate > 0
+
+    # Past the token's expiry the entry is gone and the token is verified
+    # again, which rejects it once it has actually expired
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    deps.decode_token(token)
+    assert decodes == 2
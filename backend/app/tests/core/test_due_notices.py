@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from sqlmodel import Session, col, delete, select
+
+from app.core.db import engine
+from app.core.due_notices import (
+    _user_batches,
+    render_renewal_digest,
+    send_due_notices,
+)
+from app.models import EmailOutbox, Subscription, User, UserPreferences
+from app.tests.utils.user import create_random_user
+from app.tests.utils.utils import random_lower_string
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def emails_enabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("app.core.config.settings.SMTP_HOST", "smtp.example.com")
+    monkeypatch.setattr("app.core.config.settings.EMAILS_FROM_EMAIL", "a@example.com")
+
+
+def _user(
+    db: Session,
+    *,
+    email_notifications: bool = True,
+    reminder_days: int = 5,
+    **kwargs: Any,
+) -> User:
+    user = create_random_user(db)
+    db.add(
+        UserPreferences(
+            user_id=user.id,
+            email_notifications=email_notifications,
+            reminder_days=reminder_days,
+            **kwargs,
+        )
+    )
+    db.commit()
+    return user
+
+
+def _subscription(db: Session, user: User, due_in: timedelta, **kwargs: Any) -> Any:
+    subscription = Subscription(
+        user_id=user.id,
+        name=random_lower_string()[:20],
+        next_billing_date=NOW + due_in,
+        **kwargs,
+    )
+    db.add(subscription)
+    db.commit()
+    return subscription
+
+
+def _emails_to(db: Session, user: User) -> list[EmailOutbox]:
+    return list(db.exec(select(EmailOutbox).where(EmailOutbox.email_to == user.email)))
+
+
+def test_user_batches_keep_users_whole() -> None:
+    rows = [SimpleNamespace(user_id=user_id) for user_id in "aabbbcd"]
+    batches = list(_user_batches(rows, batch_users=2))  # type: ignore[arg-type]
+    assert [[user_id for user_id, _ in batch] for batch in batches] == [
+        ["a", "b"],
+        ["c", "d"],
+    ]
+    assert [len(user_rows) for user_id, user_rows in batches[0]] == [2, 3]
+
+
+def _renewal(name: str, amount: float | None, currency: str | None) -> Any:
+    return SimpleNamespace(
+        id=name,
+        name=name,
+        amount=amount,
+        currency=currency,
+        next_billing_date=NOW,
+    )
+
+
+def test_renewal_digest_totals_per_currency() -> None:
+    renewals = [
+        _renewal("Music", 0.1, "USD"),
+        _renewal("Video", 0.2, None),
+        _renewal("Cloud", 1200, "JPY"),
+        _renewal("Gym", None, "EUR"),
+        _renewal("<News>", 5, "EUR"),
+    ]
+    subject, html_content = render_renewal_digest(
+        "user@example.com", renewals, currency="USD"
+    )
+    assert subject.endswith("5 upcoming subscription renewals")
+    assert "0.30 USD" in html_content
+    assert "1,200 JPY" in html_content
+    assert "5.00 EUR" in html_content
+    assert "&lt;News&gt;" in html_content
+    assert "January 01, 2030" in html_content
+
+
+def test_renewal_digest_language() -> None:
+    renewals = [_renewal("Music", 3, "EUR")]
+    for language in ("fr", "French", "fr-CA"):
+        subject, html_content = render_renewal_digest(
+            "user@example.com", renewals, language=language
+        )
+        assert "Renouvellement d'abonnement" in subject
+        assert "01/01/2030" in html_content
+    subject, _ = render_renewal_digest("user@example.com", renewals, language="xx")
+    assert subject.endswith("Upcoming subscription renewal")
+
+
+def test_renewal_digest_escapes_user_values() -> None:
+    renewals = [_renewal("Music", 3, "<b>x</b>"), _renewal(None, 2, None)]  # type: ignore[arg-type]
+    _, html_content = render_renewal_digest(
+        "user@example.com", renewals, currency="<i>"
+    )
+    assert "<b>" not in html_content
+    assert "<i>" not in html_content
+    assert "3.00 &lt;B&gt;X&lt;/B&gt;" in html_content
+    assert "2.00 &lt;I&gt;" in html_content
+    assert "None" not in html_content
+
+
+def test_due_notices(db: Session) -> None:
+    user = _user(db, reminder_days=5, language="de", currency="EUR")
+    due = [
+        _subscription(db, user, timedelta(days=1), amount=4.5),
+        _subscription(db, user, timedelta(days=4), amount=10, currency="EUR"),
+    ]
+    # Outside the user's reminder days, inactive, already past
+    _subscription(db, user, timedelta(days=6))
+    _subscription(db, user, timedelta(days=2), active=False)
+    _subscription(db, user, timedelta(days=-1))
+    other = _user(db, reminder_days=10)
+    _subscription(db, other, timedelta(days=8))
+    muted = _user(db, email_notifications=False)
+    _subscription(db, muted, timedelta(days=1))
+    no_billing_updates = _user(db, billing_updates=False)
+    _subscription(db, no_billing_updates, timedelta(days=1))
+
+    result = send_due_notices(engine, now=NOW, fetch_size=2, batch_users=1)
+    assert result.subscriptions >= 3
+
+    [email] = _emails_to(db, user)
+    for subscription in due:
+        assert subscription.name in email.html_content
+    assert "2 anstehende Abo-Verlängerungen" in email.subject
+    assert "14.50 EUR" in email.html_content
+    assert len(_emails_to(db, other)) == 1
+    assert _emails_to(db, muted) == []
+    assert _emails_to(db, no_billing_updates) == []
+
+    # Nothing new on a rerun
+    send_due_notices(engine, now=NOW)
+    assert len(_emails_to(db, user)) == 1
+
+    # A renewal moves the billing date on, that one gets its own notice
+    renewed = db.get(Subscription, due[0].id)
+    assert renewed
+    renewed.next_billing_date = NOW + timedelta(days=3)
+    db.add(renewed)
+    db.commit()
+    send_due_notices(engine, now=NOW)
+    emails = _emails_to(db, user)
+    assert len(emails) == 2
+
+    db.exec(  # type: ignore[call-overload]
+        delete(EmailOutbox).where(
+            col(EmailOutbox.email_to).in_([user.email, other.email])
+        )
+    )
+    db.commit()
@@ -0,0 +1,100 @@
+import datetime
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import google_auth
+from app.core.google_auth import GoogleCertStore, verify_google_token
+
+crypto = pytest.importorskip("cryptography")
+
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+from google.auth import crypt  # noqa: E402
+from google.auth import jwt as google_jwt  # noqa: E402
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+def _key_pair() -> tuple[str, str]:
+    """A private key and a self-signed certificate for it, as PEM."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    return private_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def _id_token(private_pem: str, key_id: str) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234",
+        "email": "someone@example.com",
+        "iat": now,
+        "exp": now + 600,
+    }
+    signer = crypt.RSASigner.from_string(private_pem, key_id=key_id)
+    return google_jwt.encode(signer, payload).decode()
+
+
+def test_certs_cached_and_refetched_on_rotation(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(google_auth.settings, "GOOGLE_CLIENT_ID", CLIENT_ID)
+    old_private, old_cert = _key_pair()
+    new_private, new_cert = _key_pair()
+    published = {"old": old_cert}
+    requested: list[str] = []
+
+    def fetcher(url: str) -> tuple[dict[str, str], float]:
+        requested.append(url)
+        return dict(published), 3600
+
+    store = GoogleCertStore(url="http://certs.test", fetcher=fetcher)
+    old_token = _id_token(old_private, "old")
+    assert verify_google_token(old_token, store)["sub"] == "1234"
+    assert verify_google_token(old_token, store)["sub"] == "1234"
+    assert requested == ["http://certs.test"]
+
+    # A while later, Google starts signing with a new key before our copy
+    # expires
+    store._fetched_at -= store.min_refresh_interval
+    published["new"] = new_cert
+    new_token = _id_token(new_private, "new")
+    assert verify_google_token(new_token, store)["email"] == "someone@example.com"
+    assert len(requested) == 2
+
+    # Unknown key ids don't cause a fetch per request
+    with pytest.raises(HTTPException):
+        verify_google_token(_id_token(new_private, "bogus"), store)
+    assert len(requested) == 2
+
+
+def test_cache_lifetime_from_headers() -> None:
+    assert (
+        google_auth._cache_lifetime(
+            {"cache-control": "public, max-age=19800, must-revalidate", "age": "800"}
+        )
+        == 19000
+    )
+    assert google_auth._cache_lifetime({"cache-control": "no-cache"}) == 0
+    assert google_auth._cache_lifetime({}) == 0
@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import jwks
+from app.core.jwt_keys import TokenKeys
+
+
+def _write_private_key(path: Path, key: Any) -> None:
+    path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+
+
+def _write_public_key(path: Path, key: Any) -> None:
+    path.write_bytes(
+        key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+
+
+def test_hs256_publishes_no_keys() -> None:
+    keys = TokenKeys("HS256", "secret")
+    assert keys.decode(keys.encode({"sub": "user"}))["sub"] == "user"
+    assert json.loads(keys.jwks_json) == {"keys": []}
+
+
+@pytest.mark.parametrize(
+    "algorithm,generate",
+    [
+        ("RS256", lambda: rsa.generate_private_key(65537, 2048)),
+        ("EdDSA", ed25519.Ed25519PrivateKey.generate),
+    ],
+)
+def test_tokens_verify_with_published_keys(
+    tmp_path: Path, algorithm: str, generate: Any
+) -> None:
+    _write_private_key(tmp_path / "2024-01.pem", generate())
+    keys = TokenKeys(algorithm, "secret", str(tmp_path), signing_kid="2024-01")
+    token = keys.encode({"sub": "user"})
+    assert jwt.get_unverified_header(token)["kid"] == "2024-01"
+
+    # What another service does with the JWKS document
+    published = jwt.PyJWKSet.from_json(keys.jwks_json.decode())["2024-01"]
+    payload = jwt.decode(token, published.key, algorithms=[algorithm])
+    assert payload["sub"] == "user"
+    assert keys.decode(token)["sub"] == "user"
+
+
+def test_key_rotation(tmp_path: Path) -> None:
+    old_key = ed25519.Ed25519PrivateKey.generate()
+    _write_private_key(tmp_path / "old.pem", old_key)
+    old_keys = TokenKeys("EdDSA", "secret", str(tmp_path), signing_kid="old")
+    old_token = old_keys.encode({"sub": "user"})
+
+    # The new key signs, the retired one is kept as a public key only
+    _write_public_key(tmp_path / "old.pem", old_key)
+    _write_private_key(tmp_path / "new.pem", ed25519.Ed25519PrivateKey.generate())
+    keys = TokenKeys("EdDSA", "secret", str(tmp_path), signing_kid="new")
+    assert jwt.get_unverified_header(keys.encode({"sub": "user"}))["kid"] == "new"
+    assert keys.decode(old_token)["sub"] == "user"
+    assert {key["kid"] for key in json.loads(keys.jwks_json)["keys"]} == {
+        "old",
+        "new",
+    }
+
+    # Once dropped, tokens signed with it are no longer accepted
+    (tmp_path / "old.pem").unlink()
+    keys = TokenKeys("EdDSA", "secret", str(tmp_path), signing_kid="new")
+    with pytest.raises(jwt.InvalidTokenError):
+        keys.decode(old_token)
+
+
+def test_mismatched_key_type_is_rejected(tmp_path: Path) -> None:
+    _write_private_key(tmp_path / "rsa.pem", rsa.generate_private_key(65537, 2048))
+    with pytest.raises(ValueError):
+        TokenKeys("EdDSA", "secret", str(tmp_path), signing_kid="rsa")
+
+
+def test_jwks_endpoint() -> None:
+    app = FastAPI()
+    app.include_router(jwks.router)
+    with TestClient(app) as c:
+        r = c.get("/.well-known/jwks.json")
+    assert r.status_code == 200
+    assert "keys" in r.json()
+    assert "max-age" in r.headers["Cache-Control"]
@@ -0,0 +1,94 @@
+import asyncio
+import ipaddress
+import uuid
+
+import pytest
+from fastapi import HTTPException, Request
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import login_throttle
+from app.core.config import settings
+from app.core.login_throttle import (
+    LoginThrottle,
+    MemoryLoginFailures,
+    PostgresLoginFailures,
+    client_ip,
+)
+
+
+async def _exercise(throttle: LoginThrottle) -> None:
+    email = f"{uuid.uuid4().hex}@example.com"
+    ip = f"ip-{uuid.uuid4().hex}"
+    for _ in range(throttle.max_per_email):
+        await throttle.check(email, ip)
+        await throttle.record_failure(email, ip)
+    with pytest.raises(HTTPException) as exc_info:
+        await throttle.check(email.upper(), "another-ip")
+    assert exc_info.value.status_code == 429
+
+    # Other accounts from the same address are still let through
+    await throttle.check(f"{uuid.uuid4().hex}@example.com", ip)
+
+    await throttle.record_success(email, ip)
+    await throttle.check(email, ip)
+
+
+def test_memory_login_throttle() -> None:
+    throttle = LoginThrottle(
+        MemoryLoginFailures(window=60), window=60, max_per_email=3, max_per_ip=10
+    )
+    asyncio.run(_exercise(throttle))
+
+
+def test_memory_login_failures_expire() -> None:
+    failures = MemoryLoginFailures(window=0.05)
+
+    async def main() -> None:
+        await failures.record(["email:a@example.com"])
+        assert (await failures.counts(["email:a@example.com"])) == {
+            "email:a@example.com": 1
+        }
+        await asyncio.sleep(0.06)
+        assert (await failures.counts(["email:a@example.com"])) == {
+            "email:a@example.com": 0
+        }
+
+    asyncio.run(main())
+
+
+def test_postgres_login_throttle() -> None:
+    async def main() -> None:
+        # A fresh engine: async connections can't cross event loops
+        engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+        try:
+            throttle = LoginThrottle(
+                PostgresLoginFailures(engine, window=60),
+                window=60,
+                max_per_email=3,
+                max_per_ip=10,
+            )
+            await _exercise(throttle)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+def _request(peer: str, forwarded: str | None = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "client": (peer, 1234), "headers": headers})
+
+
+def test_client_ip_behind_trusted_proxies(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        login_throttle, "_trusted_proxies", [ipaddress.ip_network("10.0.0.0/8")]
+    )
+    # Straight from the client, a forwarded header is the client's own word
+    assert client_ip(_request("203.0.113.9", "198.51.100.1")) == "203.0.113.9"
+    assert client_ip(_request("10.0.0.2", "198.51.100.1")) == "198.51.100.1"
+    # Entries left of the first untrusted hop could be spoofed
+    assert (
+        client_ip(_request("10.0.0.2", "192.0.2.7, 198.51.100.1, 10.0.0.3"))
+        == "198.51.100.1"
+    )
+    assert client_ip(_request("10.0.0.2")) == "10.0.0.2"
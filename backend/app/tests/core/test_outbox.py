@@ -0,0 +1,108 @@
+import threading
+from collections.abc import Generator
+from datetime import datetime, timedelta
+from typing import Any
+
+import pytest
+from sqlmodel import Session, col, delete, select
+
+from app.core.db import engine
+from app.core.outbox import OutboxWorker, enqueue_email
+from app.models import EmailOutbox
+from app.tests.utils.utils import random_email
+
+
+@pytest.fixture
+def outbox(db: Session) -> Generator[None, None, None]:
+    db.exec(delete(EmailOutbox))  # type: ignore[call-overload]
+    db.commit()
+    yield
+    db.exec(delete(EmailOutbox))  # type: ignore[call-overload]
+    db.commit()
+
+
+def _enqueue(db: Session, count: int, monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    monkeypatch.setattr("app.core.config.settings.SMTP_HOST", "smtp.example.com")
+    monkeypatch.setattr("app.core.config.settings.EMAILS_FROM_EMAIL", "a@example.com")
+    recipients = [random_email() for _ in range(count)]
+    for email_to in recipients:
+        enqueue_email(db, email_to=email_to, subject="Hi", html_content="<p>Hi</p>")
+    db.commit()
+    return recipients
+
+
+def test_retry_delay_backs_off_up_to_the_cap() -> None:
+    worker = OutboxWorker(engine, backoff=10, max_backoff=60)
+    assert 5 <= worker.retry_delay(1) <= 10
+    assert 20 <= worker.retry_delay(3) <= 40
+    assert 30 <= worker.retry_delay(10) <= 60
+
+
+@pytest.mark.usefixtures("outbox")
+def test_nothing_queued_without_email_settings(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr("app.core.config.settings.SMTP_HOST", None)
+    assert enqueue_email(db, email_to=random_email(), subject="Hi") is None
+    db.commit()
+    assert db.exec(select(EmailOutbox)).all() == []
+
+
+@pytest.mark.usefixtures("outbox")
+def test_failed_sends_are_retried_then_given_up(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    [email_to] = _enqueue(db, 1, monkeypatch)
+
+    def send(**_kwargs: Any) -> None:
+        raise ConnectionRefusedError("smtp down")
+
+    worker = OutboxWorker(engine, send=send, max_attempts=2, backoff=60)
+    assert worker.process_batch() == 1
+    email = db.exec(select(EmailOutbox).where(EmailOutbox.email_to == email_to)).one()
+    assert email.status == "pending"
+    assert email.attempts == 1
+    assert "smtp down" in (email.last_error or "")
+    assert email.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+    # Not due again yet
+    assert worker.process_batch() == 0
+
+    email.next_attempt_at = datetime.utcnow()
+    db.add(email)
+    db.commit()
+    assert worker.process_batch() == 1
+    db.refresh(email)
+    assert email.status == "failed"
+    assert (worker.retried, worker.failed, worker.sent) == (1, 1, 0)
+
+
+@pytest.mark.usefixtures("outbox")
+def test_concurrent_workers_deliver_each_email_once(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    recipients = _enqueue(db, 40, monkeypatch)
+    delivered: list[str] = []
+    lock = threading.Lock()
+
+    def send(*, email_to: str, **_kwargs: Any) -> None:
+        with lock:
+            delivered.append(email_to)
+
+    workers = [OutboxWorker(engine, send=send, batch_size=5) for _ in range(4)]
+
+    def drain(worker: OutboxWorker) -> None:
+        while worker.process_batch():
+            pass
+
+    threads = [threading.Thread(target=drain, args=(w,)) for w in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(delivered) == sorted(recipients)
+    sent = db.exec(
+        select(EmailOutbox).where(col(EmailOutbox.email_to).in_(recipients))
+    ).all()
+    assert {email.status for email in sent} == {"sent"}
+    assert sum(worker.stats().sent for worker in workers) == len(recipients)
@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from app import crud
+from app.core.db import async_engine
+from app.core.revocation import (
+    BloomFilter,
+    RevokedSessions,
+    UserAuthStates,
+    record_user_deletion,
+)
+from app.models import User, UserUpdate
+from app.tests.utils.user import create_random_user
+
+
+def test_bloom_filter_has_no_false_negatives() -> None:
+    bloom = BloomFilter(bits=1 << 12, hashes=4)
+    keys = [uuid.uuid4().bytes for _ in range(200)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+
+
+def test_revoked_sessions_forget_after_retention() -> None:
+    revoked = RevokedSessions(retention=timedelta(hours=1))
+    recent, old, other = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    revoked.add(recent, datetime.utcnow())
+    revoked.add(old, datetime.utcnow() - timedelta(hours=2))
+    assert revoked.is_revoked(recent)
+    assert revoked.is_revoked(old)
+    assert not revoked.is_revoked(other)
+
+    # Tokens of sessions revoked longer ago than their lifetime have expired
+    revoked._prune()
+    assert revoked.is_revoked(recent)
+    assert not revoked.is_revoked(old)
+    assert len(revoked) == 1
+
+
+def test_user_auth_states_follow_version_bumps(db: Session) -> None:
+    user = create_random_user(db)
+    states = UserAuthStates()
+    asyncio.run(states.refresh(async_engine))
+    state = states.get(user.id)
+    assert state and state.is_active
+
+    crud.update_user(session=db, db_user=user, user_in=UserUpdate(is_active=False))
+    asyncio.run(states.refresh(async_engine))
+    new_state = states.get(user.id)
+    assert new_state
+    assert new_state.token_version == state.token_version + 1
+    assert not new_state.is_active
+
+
+def test_user_auth_states_drop_deleted_users(db: Session) -> None:
+    user = create_random_user(db)
+    states = UserAuthStates()
+    asyncio.run(states.refresh(async_engine))
+    assert states.get(user.id)
+
+    # Deleted by another worker
+    db_user = db.get(User, user.id)
+    db.delete(db_user)
+    record_user_deletion(db, user.id)
+    db.commit()
+    asyncio.run(states.refresh(async_engine))
+    assert states.get(user.id) is None
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.core.security import HashingExecutor, calibrate_password_hashing
+
+
+def test_hashing_executor_rejects_when_saturated() -> None:
+    executor = HashingExecutor(workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main() -> None:
+        running = asyncio.create_task(executor.run(release.wait))
+        queued = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        assert executor.stats().queued == 1
+
+        with pytest.raises(HTTPException) as exc_info:
+            await executor.run(release.wait)
+        assert exc_info.value.status_code == 503
+
+        release.set()
+        assert await running is True
+        assert await queued is True
+
+    asyncio.run(main())
+    stats = executor.stats()
+    assert stats.rejected == 1
+    assert stats.in_flight == 0
+    assert stats.duration.count == 2
+
+
+def test_cancelled_callers_keep_their_slot_until_the_hash_ends() -> None:
+    executor = HashingExecutor(workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def main() -> None:
+        running = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        running.cancel()
+        await asyncio.sleep(0.05)
+        # The thread is still hashing, so there is no room for another
+        assert executor.stats().in_flight == 1
+        with pytest.raises(HTTPException):
+            await executor.run(release.wait)
+
+    asyncio.run(main())
+    release.set()
+    executor._executor.shutdown(wait=True)
+    assert executor.stats().in_flight == 0
+
+
+def test_calibration_raises_minimum_cost() -> None:
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secret")
+
+    calibration = calibrate_password_hashing(
+        budget_seconds=60, min_rounds=4, max_rounds=6, context=context
+    )
+    # Even a slow machine fits rounds 6 in a minute
+    assert calibration.rounds == 6
+    assert context.hash("secret").startswith("$2b$06$")
+    assert context.needs_update(old_hash)
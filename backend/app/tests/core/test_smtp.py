@@ -0,0 +1,102 @@
+import asyncio
+import smtplib
+from email.message import EmailMessage
+from typing import Any
+
+from app.core.smtp import AsyncSMTPPool, SMTPPool
+from app.utils import build_email_message
+
+
+class FakeSMTP:
+    def __init__(self) -> None:
+        self.sent: list[str] = []
+        self.closed = False
+        self.disconnect_next = False
+
+    def send_message(self, message: EmailMessage) -> None:
+        if self.closed or self.disconnect_next:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        if message["To"] == "refused@example.com":
+            raise smtplib.SMTPRecipientsRefused({message["To"]: (550, b"No")})
+        self.sent.append(message["To"])
+
+    def quit(self) -> Any:
+        self.closed = True
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _pool(**kwargs: Any) -> tuple[SMTPPool, list[FakeSMTP]]:
+    connections: list[FakeSMTP] = []
+
+    def connect() -> Any:
+        connections.append(FakeSMTP())
+        return connections[-1]
+
+    return SMTPPool(connect=connect, **kwargs), connections
+
+
+def _message(email_to: str) -> EmailMessage:
+    return build_email_message(email_to=email_to, subject="Hi", html_content="Hi")
+
+
+def test_connections_are_reused() -> None:
+    pool, connections = _pool(size=2)
+    for i in range(5):
+        pool.send(_message(f"user{i}@example.com"))
+    assert len(connections) == 1
+    assert len(connections[0].sent) == 5
+
+
+def test_send_many_reports_each_message() -> None:
+    pool, connections = _pool(size=1, max_messages=3)
+    messages = [_message(f"user{i}@example.com") for i in range(7)]
+    messages[2] = _message("refused@example.com")
+    results = pool.send_many(messages)
+    assert [error is None for error in results] == [
+        True,
+        True,
+        False,
+        True,
+        True,
+        True,
+        True,
+    ]
+    assert isinstance(results[2], smtplib.SMTPRecipientsRefused)
+    # A refused recipient keeps the connection, the cap replaces it
+    assert [len(c.sent) for c in connections] == [3, 3]
+    assert all(c.closed for c in connections)
+
+
+def test_dropped_idle_connection_is_replaced() -> None:
+    pool, connections = _pool(size=1)
+    pool.send(_message("a@example.com"))
+    connections[0].disconnect_next = True
+    pool.send(_message("b@example.com"))
+    assert len(connections) == 2
+    assert connections[1].sent == ["b@example.com"]
+
+
+def test_stale_connections_are_not_reused() -> None:
+    pool, connections = _pool(size=1, max_idle=0)
+    pool.send(_message("a@example.com"))
+    pool.send(_message("b@example.com"))
+    assert len(connections) == 2
+    assert connections[0].closed
+
+
+def test_async_sends_share_the_pool() -> None:
+    pool, connections = _pool(size=2)
+    async_pool = AsyncSMTPPool(pool)
+
+    async def main() -> None:
+        await asyncio.gather(
+            *(async_pool.send(_message(f"user{i}@example.com")) for i in range(20))
+        )
+        assert await async_pool.send_many([_message("x@example.com")]) == [None]
+
+    asyncio.run(main())
+    async_pool.close()
+    assert 1 <= len(connections) <= 2
+    assert sum(len(c.sent) for c in connections) == 21
@@ -2,8 +2,9 @@ from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session
 
 from app import crud
+from app.core.cache import auth_user_cache
 from app.core.security import verify_password
-from app.models import User, UserCreate, UserUpdate
+from app.models import AuthUser, User, UserCreate, UserUpdate
 from app.tests.utils.utils import random_email, random_lower_string
 
 
@@ -89,3 +90,15 @@ def test_update_user(db: Session) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+
+
+def test_update_user_refreshes_auth_cache(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    token_version = user.token_version
+    auth_user_cache.set(str(user.id), AuthUser.model_validate(user))
+    crud.update_user(session=db, db_user=user, user_in=UserUpdate(is_active=False))
+    cached = auth_user_cache.get(str(user.id))
+    assert cached
+    assert cached.is_active is False
+    assert cached.token_version == token_version + 1
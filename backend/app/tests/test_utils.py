@@ -0,0 +1,33 @@
+import os
+from pathlib import Path
+
+from app.utils import create_email_template_environment, render_email_template
+
+
+def test_render_email_template() -> None:
+    html = render_email_template(
+        template_name="test_email.html",
+        context={"project_name": "Subie", "email": "someone@example.com"},
+    )
+    assert "someone@example.com" in html
+
+
+def test_templates_compiled_once(tmp_path: Path) -> None:
+    (tmp_path / "notice.html").write_text("Hello {{ name }}")
+    environment = create_email_template_environment(tmp_path)
+    template = environment.get_template("notice.html")
+    (tmp_path / "notice.html").write_text("Bye {{ name }}")
+    assert environment.get_template("notice.html") is template
+    assert template.render(name="Ann") == "Hello Ann"
+
+
+def test_templates_reload_when_changed(tmp_path: Path) -> None:
+    path = tmp_path / "notice.html"
+    path.write_text("Hello {{ name }}")
+    environment = create_email_template_environment(tmp_path, auto_reload=True)
+    assert environment.get_template("notice.html").render(name="Ann") == "Hello Ann"
+    path.write_text("Bye {{ name }}")
+    # Changes are detected by modification time
+    mtime = path.stat().st_mtime + 1
+    os.utime(path, (mtime, mtime))
+    assert environment.get_template("notice.html").render(name="Ann") == "Bye Ann"
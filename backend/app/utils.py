@@ -1,16 +1,19 @@
 import logging
+from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import formataddr, formatdate, make_msgid
 from pathlib import Path
 from typing import Any
 
-import emails  # type: ignore
 import jwt
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from jwt.exceptions import InvalidTokenError
 
 from app.core import security
 from app.core.config import settings
+from app.core.smtp import smtp_pool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,12 +25,51 @@ class EmailData:
     subject: str
 
 
+EMAIL_TEMPLATES_DIR = Path(__file__).parent / "email-templates" / "build"
+
+
+def create_email_template_environment(
+    directory: Path = EMAIL_TEMPLATES_DIR, auto_reload: bool = False
+) -> Environment:
+    """
+    Templates are compiled on first use and kept, and the compiled code is
+    also cached on disk for the next processes. With `auto_reload` every
+    use checks the file and recompiles it if it changed.
+    """
+    return Environment(
+        loader=FileSystemLoader(directory),
+        auto_reload=auto_reload,
+        bytecode_cache=FileSystemBytecodeCache(),
+    )
+
+
+# Edited templates show up without a restart in local development
+email_templates = create_email_template_environment(
+    auto_reload=settings.ENVIRONMENT == "local"
+)
+
+
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-        Path(__file__).parent / "email-templates" / "build" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
-    return html_content
+    template = email_templates.get_template(template_name)
+    return template.render(context)
+
+
+def build_email_message(
+    *,
+    email_to: str,
+    subject: str = "",
+    html_content: str = "",
+) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = formataddr(
+        (settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL or "")
+    )
+    message["To"] = email_to
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid()
+    message.set_content(html_content, subtype="html")
+    return message
 
 
 def send_email(
@@ -37,22 +79,21 @@ def send_email(
     html_content: str = "",
 ) -> None:
     assert settings.emails_enabled, "no provided configuration for email variables"
-    message = emails.Message(
-        subject=subject,
-        html=html_content,
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
+    smtp_pool.send(
+        build_email_message(
+            email_to=email_to, subject=subject, html_content=html_content
+        )
     )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    elif settings.SMTP_SSL:
-        smtp_options["ssl"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, smtp=smtp_options)
-    logger.info(f"send email result: {response}")
+    logger.info(f"sent email {subject!r}")
+
+
+def send_emails(messages: Sequence[EmailMessage]) -> list[Exception | None]:
+    """
+    Send many messages over as few connections as possible. Returns None for
+    each message sent and the error for each that wasn't.
+    """
+    assert settings.emails_enabled, "no provided configuration for email variables"
+    return smtp_pool.send_many(messages)
 
 
 def generate_test_email(email_to: str) -> EmailData:
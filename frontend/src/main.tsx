@@ -7,9 +7,26 @@ import './index.css';
 // import { AuthProvider } from './contexts/AuthContext';
 import { ThemeProvider } from './contexts/ThemeContext.tsx';
 import { QueryClient, QueryClientProvider } from '@tanstack/react-query';
+import { OpenAPI } from './client/core/OpenAPI';
 
 const queryClient = new QueryClient();
 
+// After a write the API sends X-DB-Primary-Until; echoing it keeps our
+// reads on the primary database until then, so they see the write.
+const PRIMARY_UNTIL_HEADER = 'x-db-primary-until';
+let primaryUntil: string | undefined;
+OpenAPI.interceptors.response.use((response) => {
+  const value = response.headers[PRIMARY_UNTIL_HEADER];
+  if (value) primaryUntil = value;
+  return response;
+});
+OpenAPI.interceptors.request.use((config) => {
+  if (primaryUntil && Number(primaryUntil) > Date.now() / 1000) {
+    config.headers = { ...config.headers, [PRIMARY_UNTIL_HEADER]: primaryUntil };
+  }
+  return config;
+});
+
 ReactDOM.createRoot(document.getElementById('root')!).render(
   <React.StrictMode>
     <QueryClientProvider client={queryClient}>